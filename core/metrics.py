@@ -0,0 +1,119 @@
+import logging
+import time
+from bisect import bisect_left
+from threading import Lock
+
+
+logger = logging.getLogger(__name__)
+
+TIME_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+QUERY_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100]
+SIZE_BUCKETS = [1024, 10240, 102400, 1048576]
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram; `buckets` are inclusive upper bounds and values
+    above the last one land in an overflow bucket.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def as_dict(self):
+        labels = [f'le_{bucket}' for bucket in self.buckets] + ['overflow']
+        return {
+            'count': self.count,
+            'sum': round(self.total, 3),
+            'mean': round(self.total / self.count, 3) if self.count else 0,
+            'max': round(self.max, 3),
+            'buckets': dict(zip(labels, self.counts)),
+        }
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.wall_ms = Histogram(TIME_BUCKETS_MS)
+        self.db_ms = Histogram(TIME_BUCKETS_MS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.response_bytes = Histogram(SIZE_BUCKETS)
+        self.statuses = {}
+
+    def as_dict(self):
+        return {
+            'wall_ms': self.wall_ms.as_dict(),
+            'db_ms': self.db_ms.as_dict(),
+            'queries': self.queries.as_dict(),
+            'response_bytes': self.response_bytes.as_dict(),
+            'statuses': dict(self.statuses),
+        }
+
+
+class MetricsRegistry:
+    """
+    In-process aggregation of per-route request metrics. Each worker process
+    keeps its own registry.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.routes = {}
+        self.started_at = time.time()
+        self.last_logged_at = time.monotonic()
+
+    def record(self, route, status, wall_ms, queries, db_ms, response_bytes):
+        with self._lock:
+            metrics = self.routes.get(route)
+            if metrics is None:
+                metrics = self.routes[route] = RouteMetrics()
+            metrics.wall_ms.observe(wall_ms)
+            metrics.db_ms.observe(db_ms)
+            metrics.queries.observe(queries)
+            if response_bytes is not None:
+                metrics.response_bytes.observe(response_bytes)
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'started_at': self.started_at,
+                'routes': {
+                    route: metrics.as_dict()
+                    for route, metrics in sorted(self.routes.items())
+                },
+            }
+
+    def reset(self):
+        with self._lock:
+            self.routes = {}
+            self.started_at = time.time()
+
+    def log_if_due(self, interval):
+        now = time.monotonic()
+        with self._lock:
+            if not interval or now - self.last_logged_at < interval:
+                return
+            self.last_logged_at = now
+            lines = [
+                f'route={route} requests={metrics.wall_ms.count} '
+                f'wall_ms_mean={metrics.wall_ms.as_dict()["mean"]} '
+                f'wall_ms_max={round(metrics.wall_ms.max, 3)} '
+                f'queries_mean={metrics.queries.as_dict()["mean"]} '
+                f'db_ms_mean={metrics.db_ms.as_dict()["mean"]}'
+                for route, metrics in sorted(self.routes.items())
+            ]
+        for line in lines:
+            logger.info(line)
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,141 @@
+import random
+import time
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from .metrics import registry
+from . import routers
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class PerformanceMiddleware:
+    """
+    Records wall time, query count, DB time and response size for a sample
+    of requests (METRICS_SAMPLE_RATE) into core.metrics.registry, keyed by
+    URL route name. Works under both WSGI and ASGI; under ASGI it counts the
+    queries run through sync_to_async(thread_sensitive=True), which is how
+    the async ORM and sync views run.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.should_sample():
+            return self.get_response(request)
+
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with self.count_queries(counter):
+            response = self.get_response(request)
+        self.record(request, response, counter, start)
+        return response
+
+    async def __acall__(self, request):
+        if not self.should_sample():
+            return await self.get_response(request)
+
+        counter = QueryCounter()
+        start = time.perf_counter()
+        # Connections are per thread, and the ORM runs in the thread that
+        # sync_to_async(thread_sensitive=True) uses for this request, not on
+        # the event loop, so the wrappers are installed (and removed) there
+        queries = await sync_to_async(self.count_queries)(counter)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(queries.close)()
+        self.record(request, response, counter, start)
+        return response
+
+    @staticmethod
+    def should_sample():
+        sample_rate = getattr(settings, 'METRICS_SAMPLE_RATE', 1.0)
+        return sample_rate > 0 and random.random() < sample_rate
+
+    @staticmethod
+    def count_queries(counter):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        return stack
+
+    def record(self, request, response, counter, start):
+        wall_ms = (time.perf_counter() - start) * 1000
+        registry.record(
+            route=self.get_route(request),
+            status=response.status_code,
+            wall_ms=wall_ms,
+            queries=counter.count,
+            db_ms=counter.duration * 1000,
+            response_bytes=None if response.streaming else len(response.content),
+        )
+        registry.log_if_due(getattr(settings, 'METRICS_LOG_INTERVAL', 60))
+
+    @staticmethod
+    def get_route(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return '<unresolved>'
+        return match.view_name
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Scopes core.routers state to one request. A request that writes sets a
+    cookie that keeps the client's next REPLICA_PIN_SECONDS of requests on
+    the primary, so it reads its own writes despite replication lag.
+    """
+    cookie_name = 'db_pinned'
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = routers.begin_request(pinned=self.cookie_name in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            state = routers.end_request(token)
+        return self.process_response(state, response)
+
+    async def __acall__(self, request):
+        token = routers.begin_request(pinned=self.cookie_name in request.COOKIES)
+        try:
+            response = await self.get_response(request)
+        finally:
+            state = routers.end_request(token)
+        return self.process_response(state, response)
+
+    def process_response(self, state, response):
+        if state.wrote:
+            response.set_cookie(
+                self.cookie_name, '1', httponly=True, samesite='Lax',
+                max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+        return response
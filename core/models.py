@@ -4,3 +4,11 @@ from django.contrib.auth.models import AbstractUser
 
 class User(AbstractUser):
   email = models.EmailField(unique=True)
+
+  class Meta(AbstractUser.Meta):
+    # Customer search in the admin matches name prefixes, and the customer
+    # changelist orders by first then last name
+    indexes = [
+      models.Index(fields=['first_name', 'last_name']),
+      models.Index(fields=['last_name']),
+    ]
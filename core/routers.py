@@ -0,0 +1,98 @@
+from contextvars import ContextVar
+from dataclasses import dataclass
+from itertools import count
+from typing import Optional
+from django.conf import settings
+
+
+PRIMARY = 'default'
+
+
+@dataclass
+class RoutingState:
+    replica: Optional[str] = None
+    pinned: bool = False
+    wrote: bool = False
+
+
+_state = ContextVar('db_routing_state', default=None)
+_next_replica = count()
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def begin_request(pinned=False):
+    return _state.set(RoutingState(pinned=pinned))
+
+
+def end_request(token):
+    state = _state.get()
+    _state.reset(token)
+    return state
+
+
+def read_from_replica():
+    """
+    Send the rest of the current request's reads to a replica, picked round
+    robin per request so a request never mixes snapshots of two replicas.
+    Has no effect outside a request, without replicas, or once the request
+    is pinned to the primary.
+    """
+    state = _state.get()
+    replicas = get_replicas()
+    if state is not None and replicas and not state.pinned:
+        state.replica = replicas[next(_next_replica) % len(replicas)]
+
+
+def pin_to_primary():
+    state = _state.get()
+    if state is not None:
+        state.pinned = True
+        state.replica = None
+
+
+class ReplicaRouter:
+    """
+    Routes reads to the replica chosen by read_from_replica() and everything
+    else to the primary. The first write of a request pins it to the primary,
+    so it reads its own writes afterwards.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is not None and state.replica and not state.pinned:
+            return state.replica
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        pin_to_primary()
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication
+        if db in get_replicas():
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Viewset mixin that serves `replica_actions` from a read replica.
+    """
+    replica_actions = ['list', 'retrieve']
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action in self.replica_actions:
+            read_from_replica()
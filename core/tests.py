@@ -1,3 +1,174 @@
-from django.test import TestCase
+from django.db import router
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from store.models import Collection, Product
+from . import routers
+from .metrics import Histogram, MetricsRegistry, registry
+from .models import User
+from .middleware import ReplicaRoutingMiddleware
 
-# Create your tests here.
+
+@override_settings(DATABASE_REPLICAS=['replica_1', 'replica_2'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.token = routers.begin_request()
+
+    def tearDown(self):
+        routers.end_request(self.token)
+
+    def test_reads_stay_on_primary_unless_requested(self):
+        self.assertEqual(router.db_for_read(Product), 'default')
+
+    def test_replica_reads_are_round_robin_per_request(self):
+        aliases = []
+        for _ in range(4):
+            token = routers.begin_request()
+            routers.read_from_replica()
+            aliases.append(router.db_for_read(Product))
+            self.assertEqual(router.db_for_read(Product), aliases[-1])
+            routers.end_request(token)
+
+        self.assertEqual(set(aliases), {'replica_1', 'replica_2'})
+        self.assertNotEqual(aliases[0], aliases[1])
+
+    def test_write_pins_request_to_primary(self):
+        routers.read_from_replica()
+
+        self.assertEqual(router.db_for_write(Product), 'default')
+        self.assertEqual(router.db_for_read(Product), 'default')
+        routers.read_from_replica()
+        self.assertEqual(router.db_for_read(Product), 'default')
+
+    def test_no_migrations_on_replicas(self):
+        self.assertFalse(router.allow_migrate('replica_1', 'store'))
+        self.assertTrue(router.allow_migrate('default', 'store'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class ReplicaRoutingMiddlewareTests(SimpleTestCase):
+    def call(self, view, **cookies):
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies)
+        return ReplicaRoutingMiddleware(view)(request)
+
+    def test_writing_request_pins_client_to_primary(self):
+        def view(request):
+            router.db_for_write(Product)
+            return HttpResponse()
+
+        response = self.call(view)
+
+        self.assertIn(ReplicaRoutingMiddleware.cookie_name, response.cookies)
+
+    def test_pinned_client_reads_from_primary(self):
+        aliases = []
+
+        def view(request):
+            routers.read_from_replica()
+            aliases.append(router.db_for_read(Product))
+            return HttpResponse()
+
+        self.call(view)
+        self.call(view, **{ReplicaRoutingMiddleware.cookie_name: '1'})
+
+        self.assertEqual(aliases, ['replica_1', 'default'])
+
+
+class HistogramTests(SimpleTestCase):
+    def test_values_land_in_the_first_bucket_they_fit(self):
+        histogram = Histogram([1, 10])
+        for value in [0, 1, 2, 10, 11, 50]:
+            histogram.observe(value)
+
+        self.assertEqual(histogram.as_dict(), {
+            'count': 6,
+            'sum': 74,
+            'mean': 12.333,
+            'max': 50,
+            'buckets': {'le_1': 2, 'le_10': 2, 'overflow': 2},
+        })
+
+    def test_empty_histogram(self):
+        self.assertEqual(Histogram([1]).as_dict()['mean'], 0)
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.registry.record('products-list', 200, wall_ms=12, queries=3, db_ms=2, response_bytes=100)
+        self.registry.record('products-list', 404, wall_ms=4, queries=1, db_ms=1, response_bytes=None)
+
+    def test_snapshot(self):
+        route = self.registry.snapshot()['routes']['products-list']
+
+        self.assertEqual(route['statuses'], {200: 1, 404: 1})
+        self.assertEqual(route['wall_ms']['count'], 2)
+        self.assertEqual(route['queries']['buckets']['le_1'], 1)
+        self.assertEqual(route['response_bytes']['count'], 1)
+
+    def test_logs_once_per_interval(self):
+        self.registry.last_logged_at -= 61
+
+        with self.assertLogs('core.metrics', 'INFO') as logs:
+            self.registry.log_if_due(60)
+            self.registry.log_if_due(60)
+
+        self.assertEqual(logs.output, [
+            'INFO:core.metrics:route=products-list requests=2 wall_ms_mean=8.0 '
+            'wall_ms_max=12 queries_mean=2.0 db_ms_mean=1.5'])
+
+    def test_nothing_is_logged_before_the_interval_or_without_one(self):
+        with self.assertNoLogs('core.metrics'):
+            self.registry.log_if_due(60)
+            self.registry.last_logged_at -= 61
+            self.registry.log_if_due(0)
+
+
+class MetricsEndpointTests(TestCase):
+    def get(self, is_staff):
+        self.client.force_login(
+            User.objects.create(username='user', email='user@example.com', is_staff=is_staff))
+        return self.client.get('/__metrics__/')
+
+    def test_staff_only(self):
+        self.assertEqual(self.get(is_staff=False).status_code, 403)
+
+    def test_returns_the_snapshot(self):
+        registry.reset()
+        registry.record('products-list', 200, wall_ms=1, queries=1, db_ms=1, response_bytes=1)
+
+        response = self.get(is_staff=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('products-list', response.json()['routes'])
+
+
+@override_settings(METRICS_SAMPLE_RATE=1.0)
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        collection = Collection.objects.create(title='Collection')
+        Product.objects.create(
+            title='Chair', slug='chair', unit_price=10, inventory=5, collection=collection)
+        registry.reset()
+
+    async def test_queries_are_counted_under_asgi(self):
+        response = await self.async_client.get('/store/async/products/')
+
+        self.assertEqual(response.status_code, 200)
+        queries = registry.routes['async-products-list'].queries
+        self.assertEqual(queries.count, 1)
+        self.assertGreaterEqual(queries.total, 2)
+
+    def test_requests_are_recorded_by_route(self):
+        self.client.get('/store/collections/')
+        self.client.get('/store/collections/')
+
+        route = registry.snapshot()['routes']['collection-list']
+        self.assertEqual(route['wall_ms']['count'], 2)
+        self.assertEqual(route['statuses'], {200: 2})
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_recorded(self):
+        self.client.get('/store/collections/')
+
+        self.assertEqual(registry.routes, {})
@@ -1,3 +1,8 @@
-from django.shortcuts import render
+from django.http import JsonResponse
+from .metrics import registry
 
-# Create your views here.
+
+def metrics(request):
+    if not request.user.is_staff:
+        return JsonResponse({'detail': 'Staff only.'}, status=403)
+    return JsonResponse(registry.snapshot())
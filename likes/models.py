@@ -2,10 +2,35 @@ from django.db import models
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
+from django.db.models import Count
+
+
+class LikedItemManager(models.Manager):
+    def get_like_counts_for_many(self, obj_type, obj_ids):
+        content_type = ContentType.objects.get_for_model(obj_type)
+        counts = {obj_id: 0 for obj_id in obj_ids}
+
+        rows = LikedItem.objects \
+            .filter(
+                content_type=content_type,
+                object_id__in=counts.keys()
+            ) \
+            .values('object_id') \
+            .annotate(likes_count=Count('id')) \
+            .order_by()
+        for row in rows:
+            counts[row['object_id']] = row['likes_count']
+        return counts
 
 
 class LikedItem(models.Model):
+    objects = LikedItemManager()
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField()
     content_object = GenericForeignKey()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['content_type', 'object_id'])
+        ]
@@ -1,3 +1,29 @@
 from django.test import TestCase
+from core.models import User
+from store.models import Collection, Product
+from .models import LikedItem
 
-# Create your tests here.
+
+class LikedItemManagerTests(TestCase):
+    def setUp(self):
+        self.collection = Collection.objects.create(title='Collection')
+        self.chair, self.lamp = [
+            Product.objects.create(
+                title=title, slug=title.lower(), unit_price=10, inventory=5,
+                collection=self.collection)
+            for title in ['Chair', 'Lamp']]
+        for index in range(2):
+            user = User.objects.create(username=f'user{index}', email=f'user{index}@example.com')
+            LikedItem.objects.create(user=user, content_object=self.chair)
+        LikedItem.objects.create(user=user, content_object=self.collection)
+
+    def test_get_like_counts_for_many(self):
+        with self.assertNumQueries(1):
+            counts = LikedItem.objects.get_like_counts_for_many(Product, [self.chair.id, self.lamp.id])
+
+        self.assertEqual(counts, {self.chair.id: 2, self.lamp.id: 0})
+
+    def test_likes_of_other_models_are_ignored(self):
+        counts = LikedItem.objects.get_like_counts_for_many(Collection, [self.collection.id])
+
+        self.assertEqual(counts, {self.collection.id: 1})
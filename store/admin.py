@@ -1,9 +1,23 @@
 from django.contrib import admin, messages
+from django.db.models import OuterRef, Subquery
 from django.db.models.aggregates import Count
+from django.db.models.functions import Coalesce, Now
 from django.db.models.query import QuerySet
 from django.utils.html import format_html, urlencode
 from django.urls import reverse
 from . import models
+from .caching import invalidate
+from .paginations import EstimatedCountPaginator
+
+
+class LargeTableAdminMixin:
+    """
+    Changelist settings for tables too big to count: estimated/capped
+    counts for pagination, and no second COUNT(*) of the whole table for
+    the "N results (M total)" line when filtering.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class InventoryFilter(admin.SimpleListFilter):
@@ -12,16 +26,16 @@ class InventoryFilter(admin.SimpleListFilter):
 
     def lookups(self, request, model_admin):
         return [
-            ('<10', 'Low')
+            ('low', f'Low (< {models.get_low_stock_threshold()})')
         ]
 
     def queryset(self, request, queryset: QuerySet):
-        if self.value() == '<10':
-            return queryset.filter(inventory__lt=10)
+        if self.value() == 'low':
+            return queryset.low_stock()
 
 
 @admin.register(models.Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     autocomplete_fields = ['collection']
     prepopulated_fields = {
         'slug': ['title']
@@ -34,19 +48,24 @@ class ProductAdmin(admin.ModelAdmin):
     list_per_page = 10
     list_select_related = ['collection']
     search_fields = ['title']
+    # Rows per transaction in the inventory actions
+    inventory_batch_size = 1000
 
     def collection_title(self, product):
         return product.collection.title
 
     @admin.display(ordering='inventory')
     def inventory_status(self, product):
-        if product.inventory < 10:
+        if product.inventory < models.get_low_stock_threshold():
             return 'Low'
         return 'OK'
 
     @admin.action(description='Clear inventory')
     def clear_inventory(self, request, queryset):
-        updated_count = queryset.update(inventory=0)
+        updated_count = queryset.update_in_batches(
+            batch_size=self.inventory_batch_size, inventory=0, last_update=Now())
+        # update() bypasses the model signals that invalidate cached responses
+        invalidate('product')
         self.message_user(
             request,
             f'{updated_count} products were successfully updated.',
@@ -70,14 +89,9 @@ class CollectionAdmin(admin.ModelAdmin):
             }))
         return format_html('<a href="{}">{} Products</a>', url, collection.products_count)
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(
-            products_count=Count('product')
-        )
-
 
 @admin.register(models.Customer)
-class CustomerAdmin(admin.ModelAdmin):
+class CustomerAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['first_name', 'last_name',  'membership', 'orders']
     list_editable = ['membership']
     list_per_page = 10
@@ -96,8 +110,17 @@ class CustomerAdmin(admin.ModelAdmin):
         return format_html('<a href="{}">{} Orders</a>', url, customer.orders_count)
 
     def get_queryset(self, request):
+        # A correlated subquery instead of JOIN + GROUP BY over every
+        # customer: it only runs for the rows on the page, and the
+        # changelist's COUNT(*) leaves it out
+        orders_count = models.Order.objects \
+            .filter(customer=OuterRef('pk')) \
+            .order_by() \
+            .values('customer') \
+            .annotate(count=Count('id')) \
+            .values('count')
         return super().get_queryset(request).annotate(
-            orders_count=Count('order')
+            orders_count=Coalesce(Subquery(orders_count), 0)
         )
 
 
@@ -110,7 +133,7 @@ class OrderItemInline(admin.TabularInline):
 
 
 @admin.register(models.Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     autocomplete_fields = ['customer']
     inlines = [OrderItemInline]
     list_display = ['id', 'placed_at', 'customer']
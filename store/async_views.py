@@ -0,0 +1,143 @@
+"""
+Async read-only views for the catalog, served from /store/async/.
+
+They answer with the same JSON as the DRF endpoints they mirror, but query
+through Django's async ORM so an ASGI worker can keep many requests in
+flight. They skip the response cache and conditional GET handling of the
+DRF views, and answer expand= on products with a 400.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from core.routers import read_from_replica
+from .filters import ProductFilter, ProductSearchFilter
+from .models import Collection, Product, Review
+from .paginations import DefaultPagination, KeysetPagination
+from .search import get_search_backend
+from .serializers import CollectionSerializer, ProductSerializer, ReviewSerializer
+from .views import ProductViewSet, ReviewViewSet
+
+
+def json_response(data, status=200):
+    # DRF's renderer, so decimals and dates come out as on the sync endpoints
+    return HttpResponse(
+        JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def not_found(model):
+    return json_response(
+        {'detail': f'No {model._meta.object_name} matches the given query.'}, status=404)
+
+
+async def paginate(request, queryset, serializer_class):
+    page_size = DefaultPagination.page_size
+    page_query_param = DefaultPagination.page_query_param
+    try:
+        page = int(request.GET.get(page_query_param, 1))
+    except ValueError:
+        page = 0
+    count = await queryset.acount()
+    last_page = max(1, -(-count // page_size))
+    if not 1 <= page <= last_page:
+        return json_response({'detail': 'Invalid page.'}, status=404)
+
+    offset = (page - 1) * page_size
+    rows = [row async for row in queryset[offset:offset + page_size]]
+    url = request.build_absolute_uri()
+    next_link = None
+    if page < last_page:
+        next_link = replace_query_param(url, page_query_param, page + 1)
+    previous_link = None
+    if page > 2:
+        previous_link = replace_query_param(url, page_query_param, page - 1)
+    elif page == 2:
+        previous_link = remove_query_param(url, page_query_param)
+    return json_response({
+        'count': count,
+        'next': next_link,
+        'previous': previous_link,
+        'results': serializer_class(rows, many=True).data,
+    })
+
+
+def get_product_ordering(request):
+    ordering = []
+    for field in request.GET.get('ordering', '').split(','):
+        if field.strip().lstrip('-') in ProductViewSet.ordering_fields:
+            ordering.append(field.strip())
+    return ordering
+
+
+def uses_keyset_pagination(request):
+    # As ProductViewSet.paginator decides
+    return request.GET.get('pagination') == 'cursor' \
+        or KeysetPagination.cursor_query_param in request.GET
+
+
+async def keyset_paginate(request, queryset, serializer_class, view):
+    paginator = KeysetPagination()
+    request = Request(request)
+    try:
+        # The seek/count logic is shared with the DRF views, at the cost of
+        # a thread hop for the page query
+        rows = await sync_to_async(paginator.paginate_queryset)(queryset, request, view)
+    except NotFound as error:
+        return json_response({'detail': error.detail}, status=404)
+    data = serializer_class(rows, many=True).data
+    return json_response(paginator.get_paginated_response(data).data)
+
+
+@require_GET
+async def product_list(request):
+    read_from_replica()
+    if 'expand' in request.GET:
+        return json_response(
+            {'expand': 'Not supported here, use /store/products/.'}, status=400)
+    filterset = ProductFilter(request.GET, queryset=Product.objects.with_effective_price())
+    # Validating ?collection_id looks the collection up with the sync ORM,
+    # so only pay for the thread hop when a filter is actually given
+    if request.GET.keys() & filterset.filters.keys():
+        is_valid = await sync_to_async(filterset.is_valid)()
+    else:
+        is_valid = filterset.is_valid()
+    if not is_valid:
+        return json_response(filterset.errors, status=400)
+    queryset = filterset.qs
+    # Builds the query only, so it is safe on the event loop
+    terms = ProductSearchFilter().get_search_terms(Request(request))
+    if terms:
+        queryset = get_search_backend().search(queryset, terms)
+    if uses_keyset_pagination(request):
+        return await keyset_paginate(request, queryset, ProductSerializer, ProductViewSet)
+    ordering = get_product_ordering(request)
+    if ordering:
+        queryset = queryset.order_by(*ordering)
+    return await paginate(request, queryset, ProductSerializer)
+
+
+@require_GET
+async def product_detail(request, pk):
+    read_from_replica()
+    try:
+        product = await Product.objects.with_effective_price().aget(pk=pk)
+    except Product.DoesNotExist:
+        return not_found(Product)
+    return json_response(ProductSerializer(product).data)
+
+
+@require_GET
+async def collection_list(request):
+    read_from_replica()
+    collections = [collection async for collection in Collection.objects.all()]
+    return json_response(CollectionSerializer(collections, many=True).data)
+
+
+@require_GET
+async def review_list(request, product_pk):
+    read_from_replica()
+    return await keyset_paginate(
+        request, Review.objects.filter(product_id=product_pk), ReviewSerializer, ReviewViewSet)
@@ -0,0 +1,433 @@
+"""
+Synthetic dataset and per-endpoint budgets for the store API.
+
+Used by the `benchmark_api` management command, which writes a JSON report
+and fails when an endpoint exceeds its query or latency budget, and by the
+budget tests in store/tests.py, which fail on query budgets only (e.g. after
+an N+1 creeps in); wall-clock latency is too noisy on shared CI runners.
+"""
+import random
+from dataclasses import dataclass, field
+from decimal import Decimal
+from statistics import median
+from time import perf_counter
+from typing import Callable, Optional
+from uuid import uuid4
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from .caching import get_cache
+from .models import (Cart, CartItem, Collection, Customer, Order, OrderItem,
+                     Product, Promotion, Review)
+from .reporting import update_sales_rollups
+from .search import index_products
+
+
+WORDS = [
+    'oak', 'steel', 'linen', 'wool', 'chair', 'table', 'lamp', 'shelf',
+    'mug', 'bowl', 'rug', 'desk', 'sofa', 'clock', 'frame', 'vase',
+]
+
+
+@dataclass
+class Dataset:
+    collection_ids: list = field(default_factory=list)
+    product_ids: list = field(default_factory=list)
+    promotion_ids: list = field(default_factory=list)
+    customer_ids: list = field(default_factory=list)
+    order_ids: list = field(default_factory=list)
+    cart_ids: list = field(default_factory=list)
+    review_ids: list = field(default_factory=list)
+    cart_item_ids: list = field(default_factory=list)
+    user_id: Optional[int] = None
+    staff_user_id: Optional[int] = None
+
+    def sizes(self):
+        return {
+            name: len(ids) for name, ids in vars(self).items()
+            if isinstance(ids, list)
+        }
+
+
+def seed_dataset(collections=10, products=1000, customers=100, orders=500,
+                 carts=50, reviews=2000, promotions=5, items_per_cart=5,
+                 batch_size=1000, seed=0):
+    """
+    Insert a synthetic catalog with bulk_create and return the ids. Rows are
+    tagged with a random run token so seeding never collides with existing
+    data.
+    """
+    rng = random.Random(seed)
+    token = uuid4().hex[:8]
+    dataset = Dataset()
+
+    Collection.objects.bulk_create([
+        Collection(title=f'bench-{token} collection {index}')
+        for index in range(collections)
+    ], batch_size=batch_size)
+    dataset.collection_ids = list(
+        Collection.objects
+        .filter(title__startswith=f'bench-{token} ')
+        .order_by('id')
+        .values_list('id', flat=True))
+
+    Product.objects.bulk_create([
+        Product(
+            title=f'{rng.choice(WORDS)} {rng.choice(WORDS)} {index}',
+            slug=f'bench-{token}-product-{index}',
+            description=' '.join(rng.choices(WORDS, k=12)),
+            unit_price=Decimal(rng.randint(100, 99999)) / 100,
+            inventory=rng.randint(0, 200),
+            collection_id=dataset.collection_ids[index % collections])
+        for index in range(products)
+    ], batch_size=batch_size)
+    seeded_products = Product.objects \
+        .filter(slug__startswith=f'bench-{token}-') \
+        .order_by('id')
+    dataset.product_ids = [product.id for product in seeded_products]
+    for offset in range(0, products, batch_size):
+        index_products(seeded_products[offset:offset + batch_size])
+    Collection.objects \
+        .filter(pk__in=dataset.collection_ids) \
+        .refresh_products_count()
+
+    new_promotions = [
+        Promotion(description=f'bench-{token} promotion {index}',
+                  discount=rng.choice([0.05, 0.1, 0.2, 0.3]))
+        for index in range(promotions)
+    ]
+    Promotion.objects.bulk_create(new_promotions, batch_size=batch_size)
+    dataset.promotion_ids = list(
+        Promotion.objects
+        .filter(description__startswith=f'bench-{token} ')
+        .order_by('id')
+        .values_list('id', flat=True))
+    if dataset.promotion_ids:
+        # Roughly a third of the products get one or two promotions
+        Product.promotions.through.objects.bulk_create([
+            Product.promotions.through(product_id=product_id, promotion_id=promotion_id)
+            for product_id in dataset.product_ids[::3]
+            for promotion_id in rng.sample(
+                dataset.promotion_ids, min(rng.randint(1, 2), len(dataset.promotion_ids)))
+        ], batch_size=batch_size)
+
+    User = get_user_model()
+    User.objects.bulk_create([
+        User(username=f'bench-{token}-{index}',
+             email=f'bench-{token}-{index}@example.com',
+             first_name=rng.choice(WORDS), last_name=rng.choice(WORDS))
+        for index in range(customers)
+    ], batch_size=batch_size)
+    user_ids = User.objects \
+        .filter(username__startswith=f'bench-{token}-') \
+        .values_list('id', flat=True)
+    Customer.objects.bulk_create([
+        Customer(user_id=user_id, phone='000') for user_id in user_ids
+    ], batch_size=batch_size)
+    dataset.customer_ids = list(
+        Customer.objects
+        .filter(user__username__startswith=f'bench-{token}-')
+        .order_by('id')
+        .values_list('id', flat=True))
+    dataset.user_id = Customer.objects.get(pk=dataset.customer_ids[0]).user_id
+    dataset.staff_user_id = User.objects.create(
+        username=f'bench-{token}-staff', email=f'bench-{token}-staff@example.com',
+        is_staff=True).id
+
+    known_orders = set(Order.objects.values_list('id', flat=True))
+    Order.objects.bulk_create([
+        Order(customer_id=rng.choice(dataset.customer_ids),
+              payment_status=rng.choice(Order.PAYMENT_STATUS_CHOICES)[0])
+        for _ in range(orders)
+    ], batch_size=batch_size)
+    dataset.order_ids = sorted(
+        set(Order.objects.values_list('id', flat=True)) - known_orders)
+    OrderItem.objects.bulk_create([
+        OrderItem(order_id=order_id,
+                  product_id=rng.choice(dataset.product_ids),
+                  quantity=rng.randint(1, 5),
+                  unit_price=Decimal(rng.randint(100, 99999)) / 100)
+        for order_id in dataset.order_ids
+        for _ in range(rng.randint(1, 4))
+    ], batch_size=batch_size)
+
+    new_carts = [Cart() for _ in range(carts)]
+    Cart.objects.bulk_create(new_carts, batch_size=batch_size)
+    dataset.cart_ids = [cart.id for cart in new_carts]
+    CartItem.objects.bulk_create([
+        CartItem(cart_id=cart_id, product_id=product_id, quantity=rng.randint(1, 5))
+        for cart_id in dataset.cart_ids
+        for product_id in rng.sample(
+            dataset.product_ids, min(items_per_cart, len(dataset.product_ids)))
+    ], batch_size=batch_size)
+    dataset.cart_item_ids = list(
+        CartItem.objects
+        .filter(cart_id__in=dataset.cart_ids)
+        .order_by('id')
+        .values_list('id', flat=True))
+
+    known_reviews = set(Review.objects.values_list('id', flat=True))
+    review_products = dataset.product_ids[:max(1, len(dataset.product_ids) // 10)]
+    Review.objects.bulk_create([
+        Review(product_id=rng.choice(review_products),
+               name=rng.choice(WORDS),
+               description=' '.join(rng.choices(WORDS, k=20)))
+        for _ in range(reviews)
+    ], batch_size=batch_size)
+    dataset.review_ids = sorted(
+        set(Review.objects.values_list('id', flat=True)) - known_reviews)
+    Product.objects \
+        .filter(pk__in=review_products) \
+        .refresh_review_summary()
+
+    # The seeded orders were all placed just now, so roll up to now rather
+    # than leaving them to the settle delay
+    update_sales_rollups(until=timezone.now())
+
+    return dataset
+
+
+@dataclass
+class Endpoint:
+    name: str
+    method: str
+    path: Callable
+    query_budget: int
+    latency_budget_ms: float = 250
+    data: Optional[Callable] = None
+    prepare: Optional[Callable] = None
+    # Call as the dataset's staff user instead of its customer
+    staff: bool = False
+    format: str = 'json'
+
+
+def reviewed_product(dataset):
+    return Review.objects.get(pk=dataset.review_ids[0]).product_id
+
+
+def new_product(dataset):
+    return Product.objects.create(
+        title='bench product', slug='bench-product', unit_price=10, inventory=5,
+        collection_id=dataset.collection_ids[0])
+
+
+def new_collection(dataset):
+    return Collection.objects.create(title='bench collection')
+
+
+def new_review(dataset):
+    return Review.objects.create(
+        product_id=dataset.product_ids[0], name='bench', description='oak')
+
+
+def import_file(dataset, _):
+    rows = ''.join(
+        f'imported {index},bench-import-{index},,10,5,{dataset.collection_ids[0]}\n'
+        for index in range(20))
+    content = 'title,slug,description,unit_price,inventory,collection_id\n' + rows
+    return {'file': SimpleUploadedFile('products.csv', content.encode('utf-8'))}
+
+
+def new_cart_item(dataset):
+    cart = Cart.objects.create()
+    return CartItem.objects.create(
+        cart=cart, product_id=dataset.product_ids[0], quantity=1)
+
+
+def user_order(dataset):
+    return Order.objects \
+        .filter(customer__user_id=dataset.user_id) \
+        .values_list('id', flat=True) \
+        .first()
+
+
+def new_cart(dataset):
+    cart = Cart.objects.create()
+    CartItem.objects.bulk_create([
+        CartItem(cart=cart, product_id=product_id, quantity=1)
+        for product_id in dataset.product_ids[:3]
+    ])
+    return cart
+
+
+ENDPOINTS = [
+    Endpoint('products-list', 'get', lambda ds, _: '/store/products/', 3),
+    Endpoint('products-list (cursor)', 'get',
+             lambda ds, _: '/store/products/?pagination=cursor&ordering=-unit_price', 2),
+    Endpoint('products-list (filtered)', 'get',
+             lambda ds, _: f'/store/products/?collection_id={ds.collection_ids[0]}&unit_price__gt=10', 5),
+    Endpoint('products-list (search)', 'get',
+             lambda ds, _: '/store/products/?search=oak cha', 3),
+    Endpoint('products-list (effective price)', 'get',
+             lambda ds, _: '/store/products/?ordering=effective_price&effective_price__gt=20', 3),
+    Endpoint('products-list (expand)', 'get',
+             lambda ds, _: '/store/products/?expand=tags,likes_count', 5),
+    Endpoint('products-detail', 'get',
+             lambda ds, _: f'/store/products/{ds.product_ids[0]}/', 2),
+    Endpoint('products-export', 'get',
+             lambda ds, _: f'/store/products/export/?output=ndjson&collection_id={ds.collection_ids[0]}', 3,
+             latency_budget_ms=2000),
+    # Product.save() runs its count and search index receivers in a
+    # transaction, a savepoint pair when the benchmark runs inside one
+    Endpoint('products-list (create)', 'post', lambda ds, _: '/store/products/', 8,
+             data=lambda ds, _: {
+                 'title': 'oak table', 'slug': 'oak-table', 'inventory': 5,
+                 'unit_price': 10, 'collection': ds.collection_ids[0]}),
+    Endpoint('products-detail (update)', 'patch',
+             lambda ds, _: f'/store/products/{ds.product_ids[1]}/', 6,
+             data=lambda ds, _: {'title': 'oak shelf'}),
+    Endpoint('products-detail (delete)', 'delete',
+             lambda ds, product: f'/store/products/{product.id}/', 11,
+             prepare=new_product),
+    Endpoint('products-import', 'post', lambda ds, _: '/store/products/import/', 9,
+             data=import_file, staff=True, format='multipart', latency_budget_ms=1000),
+    Endpoint('collections-list', 'get', lambda ds, _: '/store/collections/', 2),
+    Endpoint('collections-detail', 'get',
+             lambda ds, _: f'/store/collections/{ds.collection_ids[0]}/', 2),
+    Endpoint('collections-list (create)', 'post', lambda ds, _: '/store/collections/', 1,
+             data=lambda ds, _: {'title': 'bench collection'}),
+    Endpoint('collections-detail (update)', 'patch',
+             lambda ds, _: f'/store/collections/{ds.collection_ids[0]}/', 2,
+             data=lambda ds, _: {'title': 'bench collection'}),
+    Endpoint('collections-detail (delete)', 'delete',
+             lambda ds, collection: f'/store/collections/{collection.id}/', 5,
+             prepare=new_collection),
+    Endpoint('product-reviews-list', 'get',
+             lambda ds, product_id: f'/store/products/{product_id}/reviews/', 1,
+             prepare=reviewed_product),
+    Endpoint('product-reviews-detail', 'get',
+             lambda ds, product_id: f'/store/products/{product_id}/reviews/{ds.review_ids[0]}/', 1,
+             prepare=reviewed_product),
+    Endpoint('product-reviews-list (create)', 'post',
+             lambda ds, _: f'/store/products/{ds.product_ids[0]}/reviews/', 2,
+             data=lambda ds, _: {'name': 'bench', 'description': 'oak'}),
+    Endpoint('product-reviews-detail (update)', 'patch',
+             lambda ds, review: f'/store/products/{review.product_id}/reviews/{review.id}/', 3,
+             data=lambda ds, _: {'description': 'oak and steel'}, prepare=new_review),
+    Endpoint('product-reviews-detail (delete)', 'delete',
+             lambda ds, review: f'/store/products/{review.product_id}/reviews/{review.id}/', 3,
+             prepare=new_review),
+    Endpoint('carts-list (create)', 'post', lambda ds, _: '/store/carts/', 3),
+    Endpoint('carts-detail', 'get', lambda ds, _: f'/store/carts/{ds.cart_ids[0]}/', 2),
+    Endpoint('carts-detail (delete)', 'delete',
+             lambda ds, cart: f'/store/carts/{cart.id}/', 4, prepare=new_cart),
+    Endpoint('cart-items-list', 'get',
+             lambda ds, _: f'/store/carts/{ds.cart_ids[0]}/items/', 1),
+    Endpoint('cart-items-list (create)', 'post',
+             lambda ds, _: f'/store/carts/{ds.cart_ids[1]}/items/', 5,
+             data=lambda ds, _: {'product_id': ds.product_ids[-1], 'quantity': 1}),
+    Endpoint('cart-items-detail', 'get',
+             lambda ds, _: f'/store/carts/{ds.cart_ids[0]}/items/{ds.cart_item_ids[0]}/', 1),
+    Endpoint('cart-items-detail (update)', 'patch',
+             lambda ds, item: f'/store/carts/{item.cart_id}/items/{item.id}/', 2,
+             data=lambda ds, item: {'quantity': 3}, prepare=new_cart_item),
+    Endpoint('cart-items-detail (delete)', 'delete',
+             lambda ds, item: f'/store/carts/{item.cart_id}/items/{item.id}/', 3,
+             prepare=new_cart_item),
+    Endpoint('cart-items-bulk', 'post',
+             lambda ds, _: f'/store/carts/{ds.cart_ids[2]}/items/bulk/', 10,
+             data=lambda ds, _: [
+                 {'product_id': product_id, 'quantity': 1}
+                 for product_id in ds.product_ids[:20]]),
+    Endpoint('orders-list', 'get', lambda ds, _: '/store/orders/', 3),
+    Endpoint('orders-detail', 'get',
+             lambda ds, order_id: f'/store/orders/{order_id}/', 2,
+             prepare=user_order),
+    Endpoint('orders-list (checkout)', 'post', lambda ds, _: '/store/orders/', 12,
+             data=lambda ds, cart: {'cart_id': str(cart.id)}, prepare=new_cart),
+    Endpoint('async-products-list', 'get', lambda ds, _: '/store/async/products/', 2),
+    Endpoint('async-products-detail', 'get',
+             lambda ds, _: f'/store/async/products/{ds.product_ids[0]}/', 1),
+    Endpoint('async-product-reviews-list', 'get',
+             lambda ds, product_id: f'/store/async/products/{product_id}/reviews/', 1,
+             prepare=reviewed_product),
+    Endpoint('async-collections-list', 'get', lambda ds, _: '/store/async/collections/', 1),
+    Endpoint('cache-stats', 'get', lambda ds, _: '/store/cache-stats/', 0, staff=True),
+    Endpoint('product-id-cache-stats', 'get',
+             lambda ds, _: '/store/cache-stats/product-ids/', 0, staff=True),
+    Endpoint('low-stock-list', 'get',
+             lambda ds, _: '/store/inventory/low-stock/?threshold=50', 1, staff=True),
+    Endpoint('product-sales-list', 'get',
+             lambda ds, _: '/store/reports/product-sales/', 2, staff=True),
+    Endpoint('product-sales-totals', 'get',
+             lambda ds, _: f'/store/reports/product-sales/totals/?since={timezone.localdate()}', 2,
+             staff=True),
+    Endpoint('collection-sales-list', 'get',
+             lambda ds, _: '/store/reports/collection-sales/', 2, staff=True),
+    Endpoint('collection-sales-totals', 'get',
+             lambda ds, _: '/store/reports/collection-sales/totals/', 2, staff=True),
+    Endpoint('customer-sales-list', 'get',
+             lambda ds, _: '/store/reports/customer-sales/', 2, staff=True),
+    Endpoint('customer-sales-totals', 'get',
+             lambda ds, _: '/store/reports/customer-sales/totals/', 2, staff=True),
+]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_benchmark(client, dataset, endpoints=ENDPOINTS, repeat=5, latency_scale=1.0):
+    """
+    Call every endpoint `repeat` times with a cold response cache and return
+    one report row per endpoint. A row passes when the worst query count and
+    the median latency are within budget.
+    """
+    User = get_user_model()
+    users = {
+        staff: User.objects.get(pk=user_id) if user_id is not None else None
+        for staff, user_id in [(False, dataset.user_id), (True, dataset.staff_user_id)]
+    }
+    report = []
+    for endpoint in endpoints:
+        client.force_authenticate(users[endpoint.staff])
+        queries = []
+        timings = []
+        statuses = set()
+        for _ in range(repeat):
+            get_cache().clear()
+            context = endpoint.prepare(dataset) if endpoint.prepare else None
+            path = endpoint.path(dataset, context)
+            kwargs = {'format': endpoint.format}
+            if endpoint.data:
+                kwargs['data'] = endpoint.data(dataset, context)
+            with CaptureQueriesContext(connection) as captured:
+                start = perf_counter()
+                response = getattr(client, endpoint.method)(path, **kwargs)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                timings.append((perf_counter() - start) * 1000)
+            queries.append(len(captured))
+            statuses.add(response.status_code)
+
+        latency_budget = endpoint.latency_budget_ms * latency_scale
+        median_ms = median(timings)
+        report.append({
+            'name': endpoint.name,
+            'method': endpoint.method.upper(),
+            'path': endpoint.path(dataset, context),
+            'statuses': sorted(statuses),
+            'queries': max(queries),
+            'query_budget': endpoint.query_budget,
+            'median_ms': round(median_ms, 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'latency_budget_ms': latency_budget,
+            'requests_per_second': round(1000 / median_ms, 1) if median_ms else None,
+            'passed': (
+                max(queries) <= endpoint.query_budget
+                and median_ms <= latency_budget
+                and all(status < 400 for status in statuses)
+            ),
+        })
+    return report
+
+
+def get_environment():
+    return {
+        'database': connection.vendor,
+        'debug': settings.DEBUG,
+    }
@@ -0,0 +1,247 @@
+import hashlib
+import time
+from threading import Lock
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, urlencode
+from rest_framework.response import Response
+from core.routers import pin_to_primary
+
+
+VERSION_KEY = 'store:version:{}'
+RESPONSE_KEY = 'store:response:{}'
+
+
+def get_cache():
+    return caches[getattr(settings, 'STORE_CACHE_ALIAS', 'default')]
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit, count=1):
+        with self._lock:
+            if hit:
+                self.hits += count
+            else:
+                self.misses += count
+
+    def as_dict(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+stats = CacheStats()
+
+
+def get_version(model_name):
+    cache = get_cache()
+    key = VERSION_KEY.format(model_name)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock rather than 1 so a counter that was evicted
+        # never comes back at a value older entries were stored under.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(*model_names):
+    cache = get_cache()
+    for model_name in model_names:
+        key = VERSION_KEY.format(model_name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate(*model_names):
+    """
+    Bump the version of the given models once the current transaction
+    commits, so readers never cache pre-commit data under the new version.
+    """
+    transaction.on_commit(lambda: bump_version(*model_names))
+
+
+def normalize_query(query_params):
+    items = []
+    for key, values in sorted(query_params.lists()):
+        for value in sorted(value for value in values if value != ''):
+            items.append((key, value))
+    return urlencode(items)
+
+
+class CachedResponseMixin:
+    """
+    Serves list/retrieve responses from the cache. Keys combine the action,
+    the lookup kwargs, the normalized query string and the current version
+    of every model in `cache_models`, so a write to any of them makes the
+    old entries unreachable instead of having to find and delete them.
+
+    Misses are filled from the primary even in replica_actions: a replica
+    lagging behind a write would otherwise store its old rows under the
+    version that write just bumped, until the cache timeout.
+    """
+    cache_models = []
+    cache_timeout = None
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_cache_models(self):
+        return self.cache_models
+
+    def get_cache_timeout(self):
+        if self.cache_timeout is None:
+            return getattr(settings, 'STORE_CACHE_TIMEOUT', 300)
+        return self.cache_timeout
+
+    def get_cache_key(self, request):
+        parts = [
+            self.basename,
+            self.action,
+            request.get_host(),
+            urlencode(sorted(self.kwargs.items())),
+            normalize_query(request.query_params),
+        ]
+        parts += [f'{name}={get_version(name)}' for name in self.get_cache_models()]
+        digest = hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest()
+        return RESPONSE_KEY.format(digest)
+
+    def get_cached_value(self, request, name, compute):
+        # Stored under the same versioned key as the response, so it goes
+        # stale exactly when the response does.
+        cache = get_cache()
+        key = f'{self.get_cache_key(request)}:{name}'
+        value = cache.get(key)
+        if value is None:
+            pin_to_primary()
+            value = compute()
+            cache.set(key, value, self.get_cache_timeout())
+        return value
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        cache = get_cache()
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            stats.record(hit=True)
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        stats.record(hit=False)
+        pin_to_primary()
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, self.get_cache_timeout())
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+class ConditionalGetMixin:
+    """
+    Adds ETag and Last-Modified to list/retrieve responses and answers
+    If-None-Match / If-Modified-Since with 304 before anything is
+    serialized. Validators come from `last_modified_field`: the object's
+    own value for retrieve, and for list its maximum over the filtered
+    queryset together with the row count (so deletions change the ETag)
+    and the normalized query string.
+    """
+    last_modified_field = 'last_update'
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().list, self.get_list_validators, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().retrieve, self.get_object_validators, request, *args, **kwargs)
+
+    def uses_conditional_get(self):
+        return True
+
+    def get_list_validators(self):
+        queryset = self.filter_queryset(self.get_queryset()).order_by()
+        aggregates = queryset.aggregate(
+            last_modified=Max(self.last_modified_field), count=Count('pk'))
+        return aggregates['last_modified'], aggregates['count']
+
+    def get_object_validators(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.get_queryset()
+        field = queryset.model._meta.pk if self.lookup_field == 'pk' \
+            else queryset.model._meta.get_field(self.lookup_field)
+        try:
+            value = field.to_python(self.kwargs[lookup_url_kwarg])
+        except (TypeError, ValueError, ValidationError):
+            # Left to get_object(), which answers 404
+            return None
+        last_modified = queryset \
+            .filter(**{self.lookup_field: value}) \
+            .values_list(self.last_modified_field, flat=True) \
+            .first()
+        if last_modified is None:
+            return None
+        return last_modified, self.kwargs[lookup_url_kwarg]
+
+    def get_validators(self, request, compute):
+        def validators():
+            values = compute()
+            if values is None or values[0] is None:
+                # Nothing to validate against, e.g. a 404 or an empty list
+                return ()
+            last_modified, *parts = values
+            parts += [
+                last_modified.isoformat(),
+                self.basename,
+                self.action,
+                request.accepted_renderer.format,
+                normalize_query(request.query_params),
+            ]
+            digest = hashlib.md5('|'.join(map(str, parts)).encode('utf-8')).hexdigest()
+            return f'W/"{digest}"', int(last_modified.timestamp())
+
+        # Views that also cache responses keep the validators next to the
+        # cached data, so a warm request costs no query.
+        if isinstance(self, CachedResponseMixin):
+            return self.get_cached_value(request, 'validators', validators)
+        return validators()
+
+    def get_conditional_response(self, handler, compute, request, *args, **kwargs):
+        if not self.uses_conditional_get():
+            return handler(request, *args, **kwargs)
+        validators = self.get_validators(request, compute)
+        if not validators:
+            return handler(request, *args, **kwargs)
+
+        etag, last_modified = validators
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
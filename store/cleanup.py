@@ -0,0 +1,65 @@
+from datetime import timedelta
+from time import sleep
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import Cart, CartItem
+
+
+def get_cart_cutoff(days=None):
+    if days is None:
+        days = getattr(settings, 'STORE_ABANDONED_CART_DAYS', 30)
+    return timezone.now() - timedelta(days=days)
+
+
+def purge_abandoned_carts(days=None, batch_size=1000, dry_run=False, pause=0.0, progress=None):
+    """
+    Delete carts created more than `days` ago (STORE_ABANDONED_CART_DAYS by
+    default) and their items, oldest first, `batch_size` carts per
+    transaction. Each batch selects the oldest cart ids through the
+    created_at index, then deletes their items and the carts with
+    WHERE ... IN (...) statements, so the work and the locks per batch
+    stay bounded. `pause` seconds between batches leave room for
+    replication.
+
+    Safe to schedule (cron, a task queue) and to interrupt: every batch
+    commits on its own. `progress(totals)` is called after each batch.
+    With dry_run nothing is deleted and the totals are what would be.
+    """
+    cutoff = get_cart_cutoff(days)
+    abandoned = Cart.objects.filter(created_at__lt=cutoff)
+    totals = {'carts': 0, 'items': 0, 'batches': 0, 'cutoff': cutoff.isoformat()}
+
+    if dry_run:
+        totals['carts'] = abandoned.count()
+        totals['items'] = CartItem.objects.filter(cart__created_at__lt=cutoff).count()
+        totals['batches'] = -(-totals['carts'] // batch_size)
+        return totals
+
+    while True:
+        with transaction.atomic():
+            cart_ids = list(
+                abandoned
+                .order_by('created_at')
+                .values_list('id', flat=True)[:batch_size])
+            if not cart_ids:
+                break
+            # CartItem has no dependents or delete signals, so deleting the
+            # items is a single DELETE. Deleting the carts then costs the
+            # collector one SELECT of the batch and a cascade DELETE that
+            # only finds items added since (kept so those cannot break the
+            # foreign key), never a query per cart.
+            items, _ = CartItem.objects.filter(cart_id__in=cart_ids).delete()
+            _, deleted = Cart.objects.filter(pk__in=cart_ids).delete()
+
+        # Items added to a cart since the first DELETE went with the cart
+        totals['items'] += items + deleted.get(CartItem._meta.label, 0)
+        totals['carts'] += deleted.get(Cart._meta.label, 0)
+        totals['batches'] += 1
+        if progress is not None:
+            progress(totals)
+        if len(cart_ids) < batch_size:
+            break
+        if pause:
+            sleep(pause)
+    return totals
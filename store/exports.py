@@ -0,0 +1,96 @@
+import csv
+import json
+from decimal import Decimal
+from django.core.serializers.json import DjangoJSONEncoder
+from .paginations import seek_filter, with_tie_breaker
+
+
+FIELDS = [
+    'id', 'title', 'slug', 'description', 'unit_price', 'effective_price', 'inventory',
+    'last_update', 'collection_id', 'collection_title', 'promotions',
+]
+CENTS = Decimal('0.01')
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def export_queryset(queryset):
+    # queryset must come from Product.objects.with_effective_price()
+    return queryset \
+        .select_related('collection') \
+        .prefetch_related('promotions')
+
+
+def product_pages(queryset, chunk_size):
+    """
+    Yield the products `chunk_size` at a time, in the queryset's order (by
+    id if it has none). Each page is its own LIMITed query seeking past the
+    last row of the previous one: iterator() does not stream on MySQL,
+    where mysqlclient buffers the whole result set, so memory would grow
+    with the catalog.
+    """
+    ordering = with_tie_breaker(queryset.query.order_by or ['id'])
+    queryset = export_queryset(queryset).order_by(*ordering)
+    page = queryset
+    while True:
+        products = list(page[:chunk_size])
+        if products:
+            yield products
+        if len(products) < chunk_size:
+            return
+        last = products[-1]
+        values = [getattr(last, field.lstrip('-')) for field in ordering]
+        page = queryset.filter(seek_filter(ordering, values))
+
+
+def product_rows(queryset, chunk_size=2000):
+    """
+    Yield one dict per product; promotions are prefetched once per page
+    rather than per product.
+    """
+    for products in product_pages(queryset, chunk_size):
+        yield from map(product_row, products)
+
+
+def product_row(product):
+    return {
+        'id': product.id,
+        'title': product.title,
+        'slug': product.slug,
+        'description': product.description,
+        'unit_price': product.unit_price,
+        # Expression results are not quantized by every backend
+        'effective_price': product.effective_price.quantize(CENTS),
+        'inventory': product.inventory,
+        'last_update': product.last_update,
+        'collection_id': product.collection_id,
+        'collection_title': product.collection.title,
+        'promotions': [promotion.id for promotion in product.promotions.all()],
+    }
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(FIELDS)
+    for row in rows:
+        row['promotions'] = ';'.join(str(id) for id in row['promotions'])
+        yield writer.writerow([row[field] for field in FIELDS])
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+def export_lines(queryset, output, chunk_size=2000):
+    rows = product_rows(queryset, chunk_size)
+    if output == 'ndjson':
+        return ndjson_lines(rows)
+    return csv_lines(rows)
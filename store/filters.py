@@ -1,11 +1,53 @@
-from django_filters.rest_framework import FilterSet
-from .models import Product
+from django_filters.rest_framework import DateFilter, FilterSet, NumberFilter
+from rest_framework.filters import SearchFilter
+from .models import DailyCollectionSales, DailyCustomerSales, DailyProductSales, Product
+from .search import get_search_backend
 
 
 class ProductFilter(FilterSet):
+  # Needs a queryset annotated by Product.objects.with_effective_price()
+  effective_price__gt = NumberFilter(field_name='effective_price', lookup_expr='gt')
+  effective_price__lt = NumberFilter(field_name='effective_price', lookup_expr='lt')
+
   class Meta:
     model = Product
     fields = {
       'collection_id': ['exact'],
       'unit_price': ['gt', 'lt']
-    }
\ No newline at end of file
+    }
+
+
+class ProductSearchFilter(SearchFilter):
+  """
+  Handles ?search= with the configured product search backend
+  (STORE_SEARCH_BACKEND) instead of LIKE over the view's search_fields.
+  """
+
+  def filter_queryset(self, request, queryset, view):
+    terms = self.get_search_terms(request)
+    if not terms:
+      return queryset
+    return get_search_backend().search(queryset, terms)
+
+
+class SalesFilter(FilterSet):
+  since = DateFilter(field_name='day', lookup_expr='gte')
+  until = DateFilter(field_name='day', lookup_expr='lte')
+
+
+class DailyProductSalesFilter(SalesFilter):
+  class Meta:
+    model = DailyProductSales
+    fields = ['product_id']
+
+
+class DailyCollectionSalesFilter(SalesFilter):
+  class Meta:
+    model = DailyCollectionSales
+    fields = ['collection_id']
+
+
+class DailyCustomerSalesFilter(SalesFilter):
+  class Meta:
+    model = DailyCustomerSales
+    fields = ['customer_id']
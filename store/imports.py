@@ -0,0 +1,181 @@
+import csv
+import json
+from collections import Counter
+from itertools import islice
+from time import perf_counter
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from .caching import invalidate
+from .models import Collection, Product
+from .search import index_products
+
+
+FIELDS = ['title', 'slug', 'description', 'unit_price', 'inventory', 'collection_id']
+REQUIRED_FIELDS = ['title', 'slug', 'unit_price', 'inventory', 'collection_id']
+MODEL_FIELDS = {name: Product._meta.get_field(name) for name in FIELDS}
+INTEGER_FIELDS = ['inventory', 'collection_id']
+UPDATE_FIELDS = ['title', 'description', 'unit_price', 'inventory', 'collection_id', 'last_update']
+
+
+class ImportReport:
+    def __init__(self, max_errors=100):
+        self.max_errors = max_errors
+        self.read = 0
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+        self.started = perf_counter()
+
+    def add_error(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def as_dict(self):
+        elapsed = perf_counter() - self.started
+        return {
+            'read': self.read,
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(self.read / elapsed, 1) if elapsed else None,
+            'errors': self.errors,
+        }
+
+
+def csv_records(lines):
+    reader = csv.DictReader(lines)
+    for record in reader:
+        yield reader.line_num, record
+
+
+def ndjson_records(lines):
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            record = error
+        yield line_number, record
+
+
+def clean_record(record):
+    """
+    Validate a record with the model fields' own to_python and validators,
+    which is much cheaper than a serializer per row. Collection existence is
+    checked per chunk by the caller.
+    """
+    if not isinstance(record, dict):
+        raise ValidationError({'record': [str(record) if isinstance(record, Exception)
+                                          else 'Expected an object.']})
+    cleaned = {}
+    errors = {}
+    for name in FIELDS:
+        value = record.get(name)
+        if value in (None, ''):
+            if name in REQUIRED_FIELDS:
+                errors[name] = ['This field is required.']
+            else:
+                cleaned[name] = None
+            continue
+        field = MODEL_FIELDS[name]
+        try:
+            if name in INTEGER_FIELDS and isinstance(value, float) and not value.is_integer():
+                # to_python would truncate an NDJSON 3.7 to 3
+                raise ValidationError(f'“{value}” value must be an integer.')
+            if name == 'collection_id':
+                # to_python only: the collections are looked up per chunk
+                # rather than by the foreign key's validate()
+                cleaned[name] = field.to_python(value)
+            else:
+                cleaned[name] = field.clean(value, None)
+        except ValidationError as error:
+            errors[name] = error.messages
+    if errors:
+        raise ValidationError(errors)
+    return cleaned
+
+
+def import_chunk(chunk, report):
+    rows = {}
+    for line, record in chunk:
+        try:
+            rows[line] = clean_record(record)
+        except ValidationError as error:
+            report.add_error(line, error.message_dict)
+
+    collection_ids = {row['collection_id'] for row in rows.values()}
+    known_collections = set(
+        Collection.objects
+        .filter(pk__in=collection_ids)
+        .values_list('id', flat=True))
+
+    # Later rows win when a slug repeats within a chunk
+    by_slug = {}
+    for line, row in rows.items():
+        if row['collection_id'] not in known_collections:
+            report.add_error(line, {'collection_id': ['No collection found with the given id.']})
+        else:
+            by_slug[row['slug']] = row
+    if not by_slug:
+        return
+
+    now = timezone.now()
+    with transaction.atomic():
+        existing = {
+            product.slug: product
+            for product in Product.objects
+            .filter(slug__in=by_slug)
+            .only('id', 'slug', 'collection_id')
+        }
+        count_deltas = Counter()
+        to_update = []
+        to_create = []
+        for slug, row in by_slug.items():
+            product = existing.get(slug)
+            if product is None:
+                to_create.append(Product(**row))
+            else:
+                count_deltas[product.collection_id] -= 1
+                for name, value in row.items():
+                    setattr(product, name, value)
+                product.last_update = now
+                to_update.append(product)
+            count_deltas[row['collection_id']] += 1
+
+        Product.objects.bulk_update(to_update, UPDATE_FIELDS)
+        Product.objects.bulk_create(to_create)
+
+        # bulk_create/bulk_update skip the signals that maintain these
+        index_products(
+            Product.objects
+            .filter(slug__in=by_slug)
+            .only('id', 'title', 'description'))
+        for collection_id, delta in count_deltas.items():
+            if delta:
+                Collection.objects.filter(pk=collection_id).adjust_products_count(delta)
+        invalidate('product', 'collection')
+
+    report.created += len(to_create)
+    report.updated += len(to_update)
+
+
+def import_products(lines, input_format='csv', chunk_size=1000, max_errors=100):
+    """
+    Upsert products by slug from an iterable of CSV or NDJSON lines and
+    return an ImportReport. Each chunk is validated, then written with one
+    bulk_update and one bulk_create in its own transaction.
+    """
+    report = ImportReport(max_errors)
+    records = ndjson_records(lines) if input_format == 'ndjson' else csv_records(lines)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        report.read += len(chunk)
+        import_chunk(chunk, report)
+    return report
@@ -0,0 +1,68 @@
+import json
+from datetime import datetime, timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+from store.benchmark import get_environment, run_benchmark, seed_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a synthetic dataset, calls every store API endpoint and checks '
+        'its query-count and latency budgets. Everything runs inside a '
+        'transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collections', type=int, default=10)
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--customers', type=int, default=100)
+        parser.add_argument('--orders', type=int, default=500)
+        parser.add_argument('--carts', type=int, default=50)
+        parser.add_argument('--reviews', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--latency-scale', type=float, default=1.0,
+            help='Multiplier applied to every latency budget.')
+        parser.add_argument(
+            '--output', help='Write the JSON report to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        setup_test_environment(debug=False)
+        try:
+            with transaction.atomic():
+                dataset = seed_dataset(
+                    collections=options['collections'],
+                    products=options['products'],
+                    customers=options['customers'],
+                    orders=options['orders'],
+                    carts=options['carts'],
+                    reviews=options['reviews'])
+                endpoints = run_benchmark(
+                    APIClient(), dataset,
+                    repeat=options['repeat'],
+                    latency_scale=options['latency_scale'])
+                transaction.set_rollback(True)
+        finally:
+            teardown_test_environment()
+
+        report = {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'environment': get_environment(),
+            'dataset': dataset.sizes(),
+            'repeat': options['repeat'],
+            'endpoints': endpoints,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        failed = [row['name'] for row in endpoints if not row['passed']]
+        if failed:
+            raise CommandError(f'Over budget: {", ".join(failed)}')
+        self.stderr.write(self.style.SUCCESS(
+            f'All {len(endpoints)} endpoints within budget.'))
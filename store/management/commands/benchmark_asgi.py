@@ -0,0 +1,160 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from statistics import median
+from time import perf_counter
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import RequestFactory
+from django.test.utils import setup_test_environment, teardown_test_environment
+from store.benchmark import percentile
+from store.caching import get_cache
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-tests a catalog path through the real WSGI and ASGI handlers, '
+        'in process: the DRF view under WSGI with a thread pool, the same '
+        'view under ASGI, and its /store/async/ counterpart under ASGI with '
+        'concurrent tasks. Reads only, against the configured database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/store/products/')
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--threads', type=int, default=4,
+                            help='WSGI worker threads.')
+        parser.add_argument('--concurrency', type=int, default=32,
+                            help='Requests in flight at once under ASGI.')
+        parser.add_argument(
+            '--warm-cache', action='store_true',
+            help='Keep the response cache of the DRF views between requests. '
+                 'By default it is cleared, since the async views do not use it.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not path.startswith('/store/'):
+            raise CommandError('--path must be a /store/ path.')
+        async_path = path.replace('/store/', '/store/async/', 1)
+
+        self.options = options
+        setup_test_environment(debug=False)
+        try:
+            results = [
+                ('wsgi', path, self.run_wsgi(path)),
+                ('asgi', path, asyncio.run(self.run_asgi(path))),
+                ('asgi', async_path, asyncio.run(self.run_asgi(async_path))),
+            ]
+        finally:
+            teardown_test_environment()
+            connections.close_all()
+
+        for server, url, result in results:
+            self.stdout.write(
+                f"{server}  {url:<32} {result['requests_per_second']:>8.1f} req/s  "
+                f"p50 {result['median_ms']:.2f} ms  p95 {result['p95_ms']:.2f} ms")
+
+    def summarize(self, timings, elapsed):
+        return {
+            'requests_per_second': len(timings) / elapsed,
+            'median_ms': median(timings),
+            'p95_ms': percentile(timings, 0.95),
+        }
+
+    def check_status(self, path, status):
+        if status >= 400:
+            raise CommandError(f'{path} answered {status}')
+
+    def run_wsgi(self, path):
+        handler = WSGIHandler()
+        environ = RequestFactory().get(path).environ
+        threads = self.options['threads']
+        per_thread = [self.options['requests'] // threads] * threads
+        per_thread[0] += self.options['requests'] % threads
+
+        def request():
+            statuses = []
+            response = handler(dict(environ), lambda status, headers: statuses.append(status))
+            try:
+                for _ in response:
+                    pass
+            finally:
+                response.close()
+            return int(statuses[0].split()[0])
+
+        def worker(count):
+            timings = []
+            try:
+                for _ in range(count):
+                    if not self.options['warm_cache']:
+                        get_cache().clear()
+                    start = perf_counter()
+                    self.check_status(path, request())
+                    timings.append((perf_counter() - start) * 1000)
+            finally:
+                connections.close_all()
+            return timings
+
+        started = perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            timings = [timing for chunk in executor.map(worker, per_thread) for timing in chunk]
+        return self.summarize(timings, perf_counter() - started)
+
+    async def run_asgi(self, path):
+        handler = ASGIHandler()
+        semaphore = asyncio.Semaphore(self.options['concurrency'])
+        timings = []
+
+        async def worker():
+            async with semaphore:
+                if not self.options['warm_cache']:
+                    get_cache().clear()
+                start = perf_counter()
+                self.check_status(path, await self.asgi_request(handler, path))
+                timings.append((perf_counter() - start) * 1000)
+
+        started = perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.options['requests'])))
+        return self.summarize(timings, perf_counter() - started)
+
+    @staticmethod
+    async def asgi_request(handler, path):
+        path, _, query = path.partition('?')
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [(b'host', b'testserver')],
+            'client': ('127.0.0.1', 0),
+            'server': ('testserver', 80),
+        }
+        received = False
+        finished = asyncio.Event()
+        status = None
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # The handler listens for a disconnect until the response is sent
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+        try:
+            await handler(scope, receive, send)
+        finally:
+            finished.set()
+        return status
@@ -0,0 +1,169 @@
+import random
+from queue import Empty, Queue
+from statistics import median
+from threading import Lock, Thread
+from time import perf_counter, sleep
+from uuid import uuid4
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+from store.models import Cart, CartItem, Collection, Customer, Order, OrderItem, Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-tests POST /store/orders/ with concurrent checkouts competing '
+        'for limited inventory, then checks that no unit was oversold. '
+        'Creates real rows and deletes them afterwards unless --keep is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=20)
+        parser.add_argument('--inventory', type=int, default=25)
+        parser.add_argument('--checkouts', type=int, default=200)
+        parser.add_argument('--items-per-cart', type=int, default=3)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--retries', type=int, default=10,
+                            help='Retries for server errors, i.e. "database is locked" on SQLite.')
+        parser.add_argument('--keep', action='store_true')
+
+    def handle(self, *args, **options):
+        self.options = options
+        token = uuid4().hex[:8]
+        setup_test_environment(debug=False)
+        try:
+            self.setup_data(token)
+            started = perf_counter()
+            self.run_checkouts()
+            elapsed = perf_counter() - started
+            self.report(elapsed)
+            self.verify()
+        finally:
+            if not options['keep']:
+                self.cleanup()
+            teardown_test_environment()
+
+    def setup_data(self, token):
+        options = self.options
+        rng = random.Random(0)
+        self.user = get_user_model().objects.create(
+            username=f'checkout-{token}', email=f'checkout-{token}@example.com')
+        self.customer = Customer.objects.create(user=self.user, phone='000')
+        self.collection = Collection.objects.create(title=f'checkout-{token}')
+        Product.objects.bulk_create([
+            Product(title=f'checkout product {index}', slug=f'checkout-{token}-{index}',
+                    unit_price=10, inventory=options['inventory'],
+                    collection=self.collection)
+            for index in range(options['products'])
+        ])
+        self.product_ids = list(
+            Product.objects.filter(collection=self.collection).values_list('id', flat=True))
+        Collection.objects.filter(pk=self.collection.pk).refresh_products_count()
+
+        carts = [Cart() for _ in range(options['checkouts'])]
+        Cart.objects.bulk_create(carts)
+        self.cart_ids = [cart.id for cart in carts]
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product_id=product_id, quantity=1)
+            for cart in carts
+            for product_id in rng.sample(
+                self.product_ids, min(options['items_per_cart'], len(self.product_ids)))
+        ])
+        self.requested = CartItem.objects \
+            .filter(cart_id__in=self.cart_ids) \
+            .aggregate(total=Sum('quantity'))['total']
+
+    def run_checkouts(self):
+        queue = Queue()
+        for cart_id in self.cart_ids:
+            queue.put(cart_id)
+        self.latencies = []
+        self.statuses = {}
+        self.lock_retries = 0
+        self.errors = []
+        lock = Lock()
+
+        def worker():
+            # Exceptions are reported through a process-wide signal, so a
+            # raising client would pick up errors from other threads' requests
+            client = APIClient(raise_request_exception=False)
+            client.force_authenticate(self.user)
+            try:
+                while True:
+                    try:
+                        cart_id = queue.get_nowait()
+                    except Empty:
+                        return
+                    status, latency, retries = self.checkout(client, cart_id)
+                    with lock:
+                        self.latencies.append(latency)
+                        self.statuses[status] = self.statuses.get(status, 0) + 1
+                        self.lock_retries += retries
+            except Exception as error:
+                with lock:
+                    self.errors.append(repr(error))
+            finally:
+                connection.close()
+
+        threads = [Thread(target=worker) for _ in range(self.options['threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def checkout(self, client, cart_id):
+        for attempt in range(self.options['retries'] + 1):
+            start = perf_counter()
+            response = client.post(
+                '/store/orders/', {'cart_id': str(cart_id)}, format='json')
+            if response.status_code != 500:
+                return response.status_code, (perf_counter() - start) * 1000, attempt
+            # A 500 here is SQLite refusing a second writer ("database is
+            # locked"); the checkout rolled back, so it is safe to retry.
+            sleep(0.01 * (attempt + 1))
+        raise CommandError(f'Checkout of cart {cart_id} kept failing with a server error')
+
+    def report(self, elapsed):
+        latencies = sorted(self.latencies)
+        completed = len(latencies)
+        self.stdout.write(f'database           {connection.vendor}')
+        self.stdout.write(f'checkouts          {completed} in {elapsed:.2f} s '
+                          f'({completed / elapsed:.1f}/s, {self.options["threads"]} threads)')
+        if latencies:
+            p95 = latencies[min(completed - 1, int(0.95 * completed))]
+            self.stdout.write(f'latency            median {median(latencies):.2f} ms, p95 {p95:.2f} ms')
+        self.stdout.write(f'responses          {dict(sorted(self.statuses.items()))}')
+        self.stdout.write(f'lock retries       {self.lock_retries}')
+        if self.errors:
+            raise CommandError(f'Workers failed: {self.errors}')
+
+    def verify(self):
+        orders = Order.objects.filter(customer=self.customer)
+        sold = OrderItem.objects \
+            .filter(order__in=orders) \
+            .aggregate(total=Sum('quantity'))['total'] or 0
+        stock = Product.objects \
+            .filter(pk__in=self.product_ids) \
+            .aggregate(total=Sum('inventory'))['total']
+        initial = self.options['inventory'] * len(self.product_ids)
+        self.stdout.write(f'units requested    {self.requested}')
+        self.stdout.write(f'units sold         {sold} of {initial}')
+
+        if Product.objects.filter(pk__in=self.product_ids, inventory__lt=0).exists():
+            raise CommandError('Inventory went negative')
+        if initial - stock != sold:
+            raise CommandError(f'Inventory decreased by {initial - stock} but {sold} units were sold')
+        if orders.count() != self.statuses.get(201, 0):
+            raise CommandError(f"{orders.count()} orders for {self.statuses.get(201, 0)} successful checkouts")
+        self.stdout.write(self.style.SUCCESS('No inventory was oversold.'))
+
+    def cleanup(self):
+        OrderItem.objects.filter(order__customer=self.customer).delete()
+        Order.objects.filter(customer=self.customer).delete()
+        Cart.objects.filter(pk__in=self.cart_ids).delete()
+        Product.objects.filter(collection=self.collection).delete()
+        self.collection.delete()
+        self.user.delete()
@@ -0,0 +1,72 @@
+from statistics import median
+from time import perf_counter
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from store.models import Collection, Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares listing collections with a Count() annotation against '
+        'reading the stored products_count. Seeds synthetic products inside '
+        'a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1_000_000)
+        parser.add_argument('--collections', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed(options['products'], options['collections'], options['batch_size'])
+
+            strategies = {
+                'annotate Count(product)': lambda: list(
+                    Collection.objects
+                    .annotate(product_total=Count('product'))
+                    .values('id', 'title', 'product_total')),
+                'stored products_count': lambda: list(
+                    Collection.objects.values('id', 'title', 'products_count')),
+            }
+            for name, run in strategies.items():
+                timings = []
+                for _ in range(options['repeat']):
+                    start = perf_counter()
+                    run()
+                    timings.append((perf_counter() - start) * 1000)
+                self.stdout.write(
+                    f'{name:<26} min {min(timings):9.2f} ms  '
+                    f'median {median(timings):9.2f} ms')
+
+            transaction.set_rollback(True)
+
+    def seed(self, product_count, collection_count, batch_size):
+        start = perf_counter()
+        collections = Collection.objects.bulk_create([
+            Collection(title=f'Benchmark collection {index}')
+            for index in range(collection_count)
+        ])
+        collection_ids = [collection.id for collection in collections]
+        if None in collection_ids:
+            collection_ids = list(
+                Collection.objects
+                .filter(title__startswith='Benchmark collection ')
+                .values_list('id', flat=True))
+
+        for offset in range(0, product_count, batch_size):
+            Product.objects.bulk_create([
+                Product(
+                    title=f'Benchmark product {index}',
+                    slug=f'benchmark-product-{index}',
+                    unit_price=10,
+                    inventory=10,
+                    collection_id=collection_ids[index % len(collection_ids)])
+                for index in range(offset, min(offset + batch_size, product_count))
+            ])
+        Collection.objects.filter(pk__in=collection_ids).refresh_products_count()
+        self.stdout.write(
+            f'Seeded {product_count} products in {collection_count} collections '
+            f'in {perf_counter() - start:.1f} s')
@@ -0,0 +1,119 @@
+from concurrent.futures import ThreadPoolExecutor
+from statistics import median
+from threading import Lock
+from time import perf_counter
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+from django.test.utils import setup_test_environment, teardown_test_environment
+from store.benchmark import percentile
+from store.caching import get_cache
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures requests/second for an API path through the full WSGI '
+        'request cycle once per CONN_MAX_AGE value, so the cost of opening a '
+        'database connection per request can be compared with reusing one. '
+        'Reads only; run it against the database of the deployment to tune.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/store/products/')
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument(
+            '--conn-max-age', default='0,60',
+            help='Comma-separated CONN_MAX_AGE values to compare (0 = no reuse).')
+        parser.add_argument(
+            '--warm-cache', action='store_true',
+            help='Keep the response cache between requests. By default it is '
+                 'cleared so every request reaches the database.')
+
+    def handle(self, *args, **options):
+        try:
+            max_ages = [int(value) for value in options['conn_max_age'].split(',')]
+        except ValueError:
+            raise CommandError('--conn-max-age takes comma-separated integers.')
+
+        self.options = options
+        self.handler = WSGIHandler()
+        self.environ = RequestFactory().get(options['path']).environ
+        self.opened = 0
+        self.lock = Lock()
+        connection_created.connect(self.count_connection)
+        setup_test_environment(debug=False)
+        try:
+            results = [self.run(max_age) for max_age in max_ages]
+        finally:
+            teardown_test_environment()
+            connection_created.disconnect(self.count_connection)
+
+        baseline = results[0]['requests_per_second']
+        for result in results:
+            speedup = result['requests_per_second'] / baseline if baseline else 0
+            self.stdout.write(
+                f"CONN_MAX_AGE={result['conn_max_age']:<5} "
+                f"{result['requests_per_second']:>8.1f} req/s  "
+                f"p50 {result['median_ms']:.2f} ms  p95 {result['p95_ms']:.2f} ms  "
+                f"{result['connections']} connections  x{speedup:.2f}")
+
+    def count_connection(self, sender, connection, **kwargs):
+        with self.lock:
+            self.opened += 1
+
+    def run(self, max_age):
+        options = self.options
+        for alias in connections:
+            connections.settings[alias]['CONN_MAX_AGE'] = max_age
+        connections.close_all()
+        self.opened = 0
+
+        per_thread = [options['requests'] // options['threads']] * options['threads']
+        per_thread[0] += options['requests'] % options['threads']
+        started = perf_counter()
+        with ThreadPoolExecutor(options['threads']) as executor:
+            timings = [
+                timing
+                for thread_timings in executor.map(self.worker, per_thread)
+                for timing in thread_timings
+            ]
+        elapsed = perf_counter() - started
+
+        return {
+            'conn_max_age': max_age,
+            'requests_per_second': len(timings) / elapsed,
+            'median_ms': median(timings),
+            'p95_ms': percentile(timings, 0.95),
+            'connections': self.opened,
+        }
+
+    def worker(self, count):
+        timings = []
+        try:
+            for _ in range(count):
+                if not self.options['warm_cache']:
+                    get_cache().clear()
+                start = perf_counter()
+                status = self.request()
+                timings.append((perf_counter() - start) * 1000)
+                if status >= 400:
+                    raise CommandError(f"{self.options['path']} answered {status}")
+        finally:
+            connections.close_all()
+        return timings
+
+    def request(self):
+        # Through WSGIHandler, unlike the test client, so request_started and
+        # request_finished close connections as a server would
+        statuses = []
+        response = self.handler(
+            dict(self.environ), lambda status, headers: statuses.append(status))
+        try:
+            for _ in response:
+                pass
+        finally:
+            response.close()
+        return int(statuses[0].split()[0])
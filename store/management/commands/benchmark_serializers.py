@@ -0,0 +1,74 @@
+from time import perf_counter
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from store.benchmark import seed_dataset
+from store.models import CartItem, Collection, Product
+from store.serializers import (CartItemSerializer, CartItemValuesSerializer, CollectionSerializer,
+                               CollectionValuesSerializer, ProductSerializer, ProductValuesSerializer)
+from store.views import annotate_cart_items
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares the per-row cost of the DRF serializers with the values() '
+        'serializers used by the list endpoints, on a seeded dataset that is '
+        'rolled back afterwards. Fails if the two render different JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        with transaction.atomic():
+            dataset = seed_dataset(
+                collections=max(1, rows // 20), products=rows, customers=1, orders=0,
+                carts=max(1, rows // 5), reviews=0, items_per_cart=5)
+            cases = [
+                ('product', ProductSerializer, ProductValuesSerializer,
+                 Product.objects.with_effective_price().filter(pk__in=dataset.product_ids)),
+                ('collection', CollectionSerializer, CollectionValuesSerializer,
+                 Collection.objects.filter(pk__in=dataset.collection_ids)),
+                ('cart item', CartItemSerializer, CartItemValuesSerializer,
+                 annotate_cart_items(CartItem.objects.filter(cart_id__in=dataset.cart_ids))),
+            ]
+            for name, serializer_class, values_serializer_class, queryset in cases:
+                self.compare(name, serializer_class, values_serializer_class,
+                             queryset.order_by('pk'), options['repeat'])
+            transaction.set_rollback(True)
+
+    def compare(self, name, serializer_class, values_serializer_class, queryset, repeat):
+        instances = list(queryset)
+        rows = list(values_serializer_class.get_queryset(queryset))
+        renderer = JSONRenderer()
+        if renderer.render(serializer_class(instances, many=True).data) != \
+                renderer.render(values_serializer_class.many(rows)):
+            raise CommandError(f'{values_serializer_class.__name__} renders different JSON')
+
+        timings = {
+            'serializer': self.time(repeat, lambda: serializer_class(instances, many=True).data),
+            'values': self.time(repeat, lambda: values_serializer_class.many(rows)),
+            'fetch + serializer': self.time(
+                repeat, lambda: serializer_class(list(queryset.all()), many=True).data),
+            'fetch + values': self.time(
+                repeat, lambda: values_serializer_class.many(
+                    list(values_serializer_class.get_queryset(queryset.all())))),
+        }
+        self.stdout.write(f'{name} ({len(rows)} rows), microseconds per row:')
+        for label, seconds in timings.items():
+            self.stdout.write(f'  {label:<20} {seconds / len(rows) * 1e6:>8.2f}')
+        self.stdout.write(
+            f"  serialization speedup x{timings['serializer'] / timings['values']:.1f}, "
+            f"with fetch x{timings['fetch + serializer'] / timings['fetch + values']:.1f}")
+
+    @staticmethod
+    def time(repeat, function):
+        best = None
+        for _ in range(repeat):
+            start = perf_counter()
+            function()
+            elapsed = perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+from store.exports import CONTENT_TYPES, export_lines
+from store.filters import ProductFilter
+from store.models import Product
+from store.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Streams the product catalog as CSV or NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', choices=sorted(CONTENT_TYPES), default='csv')
+        parser.add_argument('--file', help='Write to this file instead of stdout.')
+        parser.add_argument(
+            '--filter', action='append', default=[], metavar='NAME=VALUE',
+            help='ProductFilter parameter, e.g. --filter unit_price__gt=10. Repeatable.')
+        parser.add_argument('--search')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        data = QueryDict(mutable=True)
+        for item in options['filter']:
+            name, separator, value = item.partition('=')
+            if not separator:
+                raise CommandError(f'Expected NAME=VALUE, got {item!r}')
+            data.appendlist(name, value)
+
+        filterset = ProductFilter(data, queryset=Product.objects.with_effective_price())
+        if not filterset.is_valid():
+            raise CommandError(filterset.errors.as_text())
+        queryset = filterset.qs.order_by('id')
+        if options['search']:
+            queryset = get_search_backend().search(queryset, options['search'].split())
+
+        lines = export_lines(queryset, options['output'], options['chunk_size'])
+        if options['file']:
+            with open(options['file'], 'w', newline='') as file:
+                file.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
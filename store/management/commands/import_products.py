@@ -0,0 +1,29 @@
+import json
+from django.core.management.base import BaseCommand
+from store.imports import import_products
+
+
+class Command(BaseCommand):
+    help = 'Upserts products by slug from a CSV or NDJSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--input', choices=['csv', 'ndjson'],
+            help='Defaults to the file extension, or csv.')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--max-errors', type=int, default=100,
+                            help='Number of row errors to include in the report.')
+
+    def handle(self, *args, **options):
+        input_format = options['input']
+        if input_format is None:
+            input_format = 'ndjson' if options['path'].endswith(('.ndjson', '.jsonl')) else 'csv'
+
+        with open(options['path'], newline='', encoding='utf-8') as file:
+            report = import_products(
+                file, input_format,
+                chunk_size=options['chunk_size'],
+                max_errors=options['max_errors'])
+
+        self.stdout.write(json.dumps(report.as_dict(), indent=2))
@@ -0,0 +1,44 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from store.cleanup import purge_abandoned_carts
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes carts (and their items) created more than --days ago, in '
+        'batches of --batch-size carts per transaction. Schedule it daily; '
+        'it can be interrupted and rerun at any time.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            help='Minimum cart age. Defaults to STORE_ABANDONED_CART_DAYS.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--pause', type=float, default=0.0,
+            help='Seconds to sleep between batches, e.g. to let replicas catch up.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only count what would be deleted.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        if options['days'] is not None and options['days'] < 0:
+            raise CommandError('--days cannot be negative.')
+
+        totals = purge_abandoned_carts(
+            days=options['days'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            pause=options['pause'],
+            progress=self.report_progress if options['verbosity'] > 0 else None)
+        if options['dry_run']:
+            self.stdout.write('Dry run, nothing was deleted.')
+        self.stdout.write(json.dumps(totals, indent=2))
+
+    def report_progress(self, totals):
+        self.stdout.write(
+            f"batch {totals['batches']}: {totals['carts']} carts, "
+            f"{totals['items']} items deleted so far")
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from store.models import Product, ProductSearchToken
+from store.search import index_products
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the product search index from scratch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        products = Product.objects \
+            .order_by('id') \
+            .only('id', 'title', 'description')
+
+        indexed = 0
+        with transaction.atomic():
+            ProductSearchToken.objects.all().delete()
+            batch = []
+            for product in products.iterator(chunk_size=batch_size):
+                batch.append(product)
+                if len(batch) == batch_size:
+                    index_products(batch)
+                    indexed += len(batch)
+                    batch = []
+            if batch:
+                index_products(batch)
+                indexed += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} products.'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from store.models import Collection
+
+
+class Command(BaseCommand):
+    help = 'Recomputes Collection.products_count from the products table.'
+
+    def handle(self, *args, **options):
+        updated = Collection.objects.refresh_products_count()
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} collections.'))
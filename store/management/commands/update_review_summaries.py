@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Recomputes Product.reviews_count and last_review_date from the reviews table.'
+
+    def handle(self, *args, **options):
+        updated = Product.objects.refresh_review_summary()
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} products.'))
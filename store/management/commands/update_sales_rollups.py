@@ -0,0 +1,34 @@
+import json
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from store.reporting import update_sales_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Updates the daily sales rollups behind /store/reports/ with the '
+        'orders placed since the last run. Schedule it (e.g. hourly); pass '
+        '--since to backfill or rebuild from a date.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since', type=date.fromisoformat,
+            help='First day (YYYY-MM-DD) to recompute. Defaults to the day of '
+                 'the watermark, or of the first order.')
+        parser.add_argument(
+            '--batch-days', type=int, default=31,
+            help='Days recomputed per transaction.')
+
+    def handle(self, *args, **options):
+        if options['batch_days'] < 1:
+            raise CommandError('--batch-days must be positive.')
+
+        totals = update_sales_rollups(
+            since=options['since'],
+            batch_days=options['batch_days'],
+            progress=self.report_progress if options['verbosity'] > 0 else None)
+        self.stdout.write(json.dumps(totals, indent=2))
+
+    def report_progress(self, totals):
+        self.stdout.write(f"batch {totals['batches']}: {totals['rows']}")
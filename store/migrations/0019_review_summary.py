@@ -0,0 +1,42 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:30
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_review_summary(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    Review = apps.get_model('store', 'Review')
+    reviews = Review.objects \
+        .filter(product=OuterRef('pk')) \
+        .order_by() \
+        .values('product')
+    Product.objects.update(
+        reviews_count=Coalesce(Subquery(reviews.annotate(count=Count('id')).values('count')), 0),
+        last_review_date=Subquery(reviews.annotate(last=Max('date')).values('last')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0018_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='last_review_date',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reviews_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'date'], name='store_revie_product_a44095_idx'),
+        ),
+        migrations.RunPython(populate_review_summary, migrations.RunPython.noop),
+    ]
@@ -1,19 +1,45 @@
 from django.core.validators import MinValueValidator
 from django.contrib import admin
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, FloatField, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest, Now, Round
 from decimal import Decimal
 from uuid import uuid4
 from django.conf import settings
 
+TAX_MULTIPLIER = 1.1
+
+
 class Promotion(models.Model):
     description = models.CharField(max_length=255)
+    # Fraction taken off the unit price, e.g. 0.2 for 20% off
     discount = models.FloatField()
 
 
+class CollectionQuerySet(models.QuerySet):
+    def refresh_products_count(self):
+        counts = Product.objects \
+            .filter(collection=OuterRef('pk')) \
+            .order_by() \
+            .values('collection') \
+            .annotate(count=Count('id')) \
+            .values('count')
+        return self.update(products_count=Coalesce(Subquery(counts), 0), last_update=Now())
+
+    def adjust_products_count(self, delta):
+        return self \
+            .filter(products_count__gte=-delta) \
+            .update(products_count=F('products_count') + delta, last_update=Now())
+
+
 class Collection(models.Model):
+    objects = CollectionQuerySet.as_manager()
     title = models.CharField(max_length=255)
     featured_product = models.ForeignKey(
         'Product', on_delete=models.SET_NULL, null=True, related_name='+', blank=True)
+    # Maintained by store.signals; repair with ./manage.py update_collection_counts
+    products_count = models.PositiveIntegerField(default=0, editable=False)
+    last_update = models.DateTimeField(auto_now=True)
 
     def __str__(self) -> str:
         return self.title
@@ -22,7 +48,86 @@ class Collection(models.Model):
         ordering = ['title']
 
 
+def get_low_stock_threshold():
+    return getattr(settings, 'STORE_LOW_STOCK_THRESHOLD', 10)
+
+
+class ProductQuerySet(models.QuerySet):
+    def low_stock(self, threshold=None):
+        if threshold is None:
+            threshold = get_low_stock_threshold()
+        return self.filter(inventory__lt=threshold)
+
+    def update_in_batches(self, batch_size=1000, **values):
+        """
+        update() the rows in primary key order, `batch_size` rows per
+        transaction, so no single statement holds locks on more than one
+        batch. Returns the number of rows updated.
+        """
+        queryset = self.order_by('pk')
+        updated = 0
+        while True:
+            pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return updated
+            with transaction.atomic(using=self.db):
+                updated += Product._base_manager \
+                    .using(self.db) \
+                    .filter(pk__in=pks) \
+                    .update(**values)
+            if len(pks) < batch_size:
+                return updated
+            queryset = self.order_by('pk').filter(pk__gt=pks[-1])
+
+    def refresh_review_summary(self):
+        reviews = Review.objects \
+            .filter(product=OuterRef('pk')) \
+            .order_by() \
+            .values('product')
+        return self.update(
+            reviews_count=Coalesce(Subquery(reviews.annotate(count=Count('id')).values('count')), 0),
+            last_review_date=Subquery(reviews.annotate(last=Max('date')).values('last')),
+            last_update=Now())
+
+    def add_review(self, date):
+        return self.update(
+            reviews_count=F('reviews_count') + 1,
+            last_review_date=Greatest(Coalesce(F('last_review_date'), Value(date)), Value(date)),
+            last_update=Now())
+
+    def remove_review(self):
+        # The latest remaining date is read through the (product, date) index
+        latest = Review.objects \
+            .filter(product=OuterRef('pk')) \
+            .order_by('-date') \
+            .values('date')[:1]
+        return self \
+            .filter(reviews_count__gte=1) \
+            .update(reviews_count=F('reviews_count') - 1,
+                    last_review_date=Subquery(latest),
+                    last_update=Now())
+
+    def with_effective_price(self):
+        """
+        Annotate `effective_price`: the unit price with the product's best
+        promotion applied, then tax, rounded to cents. The best discount is
+        a correlated subquery, so a page costs one query however many
+        promotions there are, and the annotation can be filtered and
+        ordered on.
+        """
+        best_discount = Product.promotions.through.objects \
+            .filter(product_id=OuterRef('pk')) \
+            .order_by('-promotion__discount') \
+            .values('promotion__discount')[:1]
+        discount = Coalesce(
+            Subquery(best_discount, output_field=FloatField()), Value(0.0))
+        return self.annotate(effective_price=Round(ExpressionWrapper(
+            F('unit_price') * (Value(1.0) - discount) * Value(TAX_MULTIPLIER),
+            output_field=DecimalField(max_digits=8, decimal_places=2)), 2))
+
+
 class Product(models.Model):
+    objects = ProductQuerySet.as_manager()
     title = models.CharField(max_length=255)
     slug = models.SlugField()
     description = models.TextField(null=True, blank=True)
@@ -34,12 +139,34 @@ class Product(models.Model):
     last_update = models.DateTimeField(auto_now=True)
     collection = models.ForeignKey(Collection, on_delete=models.PROTECT)
     promotions = models.ManyToManyField(Promotion, blank=True)
+    # Maintained by store.signals; repair with ./manage.py update_review_summaries
+    reviews_count = models.PositiveIntegerField(default=0, editable=False)
+    last_review_date = models.DateField(null=True, editable=False)
 
     def __str__(self) -> str:
         return self.title
 
+    def save(self, *args, **kwargs):
+        # The post_save receivers (collection count, search tokens) run
+        # inside save(), so they commit or roll back with the row. delete()
+        # already sends post_delete inside its transaction.
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(Product, instance=self)):
+            super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['title']
+        # Low-stock filters and the /store/inventory/low-stock/ seek
+        indexes = [models.Index(fields=['inventory', 'id'])]
+
+
+class ProductSearchToken(models.Model):
+    token = models.CharField(max_length=64)
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='search_tokens')
+    weight = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = [['token', 'product']]
 
 
 class Customer(models.Model):
@@ -88,6 +215,10 @@ class Order(models.Model):
         max_length=1, choices=PAYMENT_STATUS_CHOICES, default=PAYMENT_STATUS_PENDING)
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT)
 
+    class Meta:
+        # For the sales rollups in store.reporting, which read by date range
+        indexes = [models.Index(fields=['placed_at'])]
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.PROTECT)
@@ -107,6 +238,10 @@ class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # For store.cleanup.purge_abandoned_carts
+        indexes = [models.Index(fields=['created_at'])]
+
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
@@ -121,4 +256,53 @@ class Review(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     name = models.CharField(max_length=255)
     description = models.TextField()
-    date = models.DateField(auto_now=True)
\ No newline at end of file
+    date = models.DateField(auto_now=True)
+
+    class Meta:
+        # Product reviews are paginated newest first by (date, id); InnoDB
+        # appends the primary key to secondary indexes
+        indexes = [models.Index(fields=['product', 'date'])]
+
+
+class SalesWatermark(models.Model):
+    """
+    How far the sales rollups have been computed: every order placed before
+    `processed_until` is counted in them.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    processed_until = models.DateTimeField()
+
+
+class DailyProductSales(models.Model):
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    orders = models.PositiveIntegerField()
+    quantity = models.PositiveIntegerField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        unique_together = [['day', 'product']]
+        indexes = [models.Index(fields=['product', 'day'])]
+
+
+class DailyCollectionSales(models.Model):
+    day = models.DateField()
+    collection = models.ForeignKey(Collection, on_delete=models.CASCADE, related_name='+')
+    orders = models.PositiveIntegerField()
+    quantity = models.PositiveIntegerField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        unique_together = [['day', 'collection']]
+        indexes = [models.Index(fields=['collection', 'day'])]
+
+
+class DailyCustomerSales(models.Model):
+    day = models.DateField()
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='+')
+    orders = models.PositiveIntegerField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        unique_together = [['day', 'customer']]
+        indexes = [models.Index(fields=['customer', 'day'])]
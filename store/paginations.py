@@ -1,4 +1,238 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from types import SimpleNamespace
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def with_tie_breaker(ordering, tie_breaker='id'):
+    """
+    `ordering` with `tie_breaker` last, in the direction of the last field,
+    so it orders rows totally.
+    """
+    ordering = [
+        field for field in ordering
+        if field.lstrip('-') not in (tie_breaker, 'pk')
+    ]
+    descending = bool(ordering) and ordering[-1].startswith('-')
+    ordering.append('-' + tie_breaker if descending else tie_breaker)
+    return ordering
+
+
+def seek_filter(ordering, values, reverse=False):
+    """
+    The rows after (or with `reverse`, before) the row whose `ordering`
+    fields hold `values`.
+    """
+    seek = Q()
+    for index, field in enumerate(ordering):
+        name = field.lstrip('-')
+        ascending = not field.startswith('-')
+        lookup = 'gt' if ascending != reverse else 'lt'
+        condition = Q(**{f'{name}__{lookup}': values[index]})
+        for equal_index in range(index):
+            equal_name = ordering[equal_index].lstrip('-')
+            condition &= Q(**{equal_name: values[equal_index]})
+        seek |= condition
+    return seek
+
 
 class DefaultPagination(PageNumberPagination):
-  page_size = 10
\ No newline at end of file
+  page_size = 10
+
+
+class KeysetPagination(BasePagination):
+    """
+    Seeks to the next page with a WHERE clause on the last row of the
+    previous one instead of an OFFSET, so deep pages cost the same as the
+    first. Rows are ordered by the view's ordering (?ordering=...) with
+    `tie_breaker` appended, and the total count is only computed when the
+    client asks for it with ?count=true.
+    """
+    page_size = 10
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    tie_breaker = 'id'
+    include_count = False
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.model = queryset.model
+        self.annotations = queryset.query.annotations
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.count = None
+        if self.should_include_count(request):
+            self.count = queryset.count()
+
+        cursor = self.decode_cursor(request)
+        reverse = False
+        if cursor is not None:
+            values, reverse = cursor
+            queryset = queryset.filter(self.get_seek_filter(values, reverse))
+
+        order_by = self.ordering
+        if reverse:
+            order_by = [self.invert(field) for field in self.ordering]
+
+        rows = list(queryset.order_by(*order_by)[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        response = {}
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['previous'] = self.get_previous_link()
+        response['results'] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_ordering(self, request, queryset, view):
+        ordering = OrderingFilter().get_ordering(request, queryset, view) or []
+        if isinstance(ordering, str):
+            ordering = [ordering]
+        return with_tie_breaker(ordering, self.tie_breaker)
+
+    def should_include_count(self, request):
+        value = request.query_params.get(self.count_query_param)
+        if value is None:
+            return self.include_count
+        return value.lower() in ('1', 'true', 'yes')
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.get_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.get_link(self.page[0], reverse=True)
+
+    def get_link(self, row, reverse):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(row, reverse))
+
+    def get_seek_filter(self, values, reverse):
+        return seek_filter(self.ordering, values, reverse)
+
+    def encode_cursor(self, row, reverse):
+        values = [self.value_to_string(row, field.lstrip('-')) for field in self.ordering]
+        payload = {'o': self.ordering, 'v': values, 'r': int(reverse)}
+        data = json.dumps(payload, separators=(',', ':')).encode('ascii')
+        return urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padding = '=' * (-len(encoded) % 4)
+            payload = json.loads(urlsafe_b64decode(encoded + padding))
+            if payload['o'] != self.ordering or len(payload['v']) != len(self.ordering):
+                raise NotFound(self.invalid_cursor_message)
+            values = [
+                self.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, payload['v'])
+            ]
+            return values, bool(payload['r'])
+        except (BinasciiError, KeyError, TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_field(self, name):
+        # Orderings on annotations (e.g. effective_price) have no model field
+        if name in self.annotations:
+            return self.annotations[name].output_field
+        return self.model._meta.get_field(name)
+
+    def value_to_string(self, row, name):
+        if isinstance(row, dict):
+            # values() rows, e.g. from views.ValuesListMixin
+            row = SimpleNamespace(**row)
+        if name in self.annotations:
+            value = getattr(row, name)
+            return None if value is None else str(value)
+        return self.model._meta.get_field(name).value_to_string(row)
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+
+def estimate_row_count(model, using):
+    """
+    The database's own estimate of the number of rows in the model's table,
+    read from its statistics instead of scanning, or None where the backend
+    keeps no such estimate.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'mysql':
+        sql = ('SELECT TABLE_ROWS FROM information_schema.TABLES '
+               'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s')
+    elif connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass'
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts exactly up to `exact_count_limit` rows, with a COUNT over a
+    LIMITed subquery so it stops there. Past the limit an unfiltered
+    queryset reports the table's estimated row count, and a filtered one
+    reports limit + 1, so pages past the limit are not linked.
+    """
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        capped = queryset.order_by()[:self.exact_count_limit + 1].count()
+        if capped <= self.exact_count_limit or queryset.query.where:
+            return capped
+        estimate = estimate_row_count(queryset.model, queryset.db)
+        return capped if estimate is None else max(estimate, capped)
@@ -0,0 +1,138 @@
+"""
+Which product ids exist, for the cart serializers' product_id validation,
+without an EXISTS query per add-to-cart request.
+
+Lookups go through a bounded in-process LRU whose entries expire after
+STORE_PRODUCT_ID_CACHE_TTL seconds, then the shared cache, then a single
+pk__in query for the ids still unknown; whatever the query finds is written
+back to both caches in bulk. Only ids that exist are cached, so a new
+product is accepted at once.
+
+Deleting a product removes it from this process's LRU and bumps the shared
+cache version (see store.signals). Other processes forget it when their
+entry expires; until then AddCartItemSerializer turns the foreign key
+error into the usual validation error.
+"""
+import time
+from collections import OrderedDict
+from threading import Lock
+from django.conf import settings
+from .caching import CacheStats, get_cache, get_version
+from .models import Product
+
+
+VERSION_NAME = 'product-ids'
+PRODUCT_ID_KEY = 'store:product-ids:{}:{}'
+
+
+class LRUCache:
+    """
+    A thread-safe set of keys holding at most `maxsize` of them, least
+    recently used first out, each for `ttl` seconds.
+    """
+
+    def __init__(self, maxsize, ttl, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = Lock()
+        self._expiry = OrderedDict()
+
+    def __contains__(self, key):
+        with self._lock:
+            expires = self._expiry.get(key)
+            if expires is None:
+                return False
+            if expires <= self.clock():
+                del self._expiry[key]
+                return False
+            self._expiry.move_to_end(key)
+            return True
+
+    def __len__(self):
+        return len(self._expiry)
+
+    def add_many(self, keys):
+        with self._lock:
+            expires = self.clock() + self.ttl
+            for key in keys:
+                self._expiry[key] = expires
+                self._expiry.move_to_end(key)
+            while len(self._expiry) > self.maxsize:
+                self._expiry.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._expiry.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._expiry.clear()
+
+
+class ProductIdCache:
+    def __init__(self):
+        self._local = None
+        self.local_stats = CacheStats()
+        self.shared_stats = CacheStats()
+
+    @property
+    def local(self):
+        # Built on first use so the size and TTL come from the settings in effect
+        if self._local is None:
+            self._local = LRUCache(
+                maxsize=getattr(settings, 'STORE_PRODUCT_ID_CACHE_SIZE', 10000),
+                ttl=getattr(settings, 'STORE_PRODUCT_ID_CACHE_TTL', 30))
+        return self._local
+
+    def exists(self, product_id):
+        return product_id in self.filter_existing([product_id])
+
+    def filter_existing(self, product_ids):
+        """
+        The subset of `product_ids` that are existing products.
+        """
+        wanted = set(product_ids)
+        found = {product_id for product_id in wanted if product_id in self.local}
+        self.local_stats.record(hit=True, count=len(found))
+        self.local_stats.record(hit=False, count=len(wanted) - len(found))
+        unknown = wanted - found
+        if not unknown:
+            return found
+
+        cache = get_cache()
+        version = get_version(VERSION_NAME)
+        keys = {PRODUCT_ID_KEY.format(version, product_id): product_id for product_id in unknown}
+        shared = {keys[key] for key in cache.get_many(keys)}
+        self.shared_stats.record(hit=True, count=len(shared))
+        self.shared_stats.record(hit=False, count=len(unknown) - len(shared))
+        unknown -= shared
+
+        queried = set()
+        if unknown:
+            queried = set(Product.objects
+                          .filter(pk__in=unknown)
+                          .order_by()
+                          .values_list('id', flat=True))
+            cache.set_many(
+                {PRODUCT_ID_KEY.format(version, product_id): True for product_id in queried},
+                getattr(settings, 'STORE_CACHE_TIMEOUT', 300))
+        self.local.add_many(shared | queried)
+        return found | shared | queried
+
+    def forget(self, product_id):
+        self.local.discard(product_id)
+
+    def clear(self):
+        if self._local is not None:
+            self._local.clear()
+
+    def stats(self):
+        return {'local': self.local_stats.as_dict(), 'shared': self.shared_stats.as_dict()}
+
+    def reset_stats(self):
+        self.local_stats.reset()
+        self.shared_stats.reset()
+
+
+product_ids = ProductIdCache()
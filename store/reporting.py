@@ -0,0 +1,137 @@
+"""
+Daily sales rollups for reporting.
+
+Revenue per product, collection and day and orders per customer and day are
+read from the Daily*Sales tables instead of aggregating OrderItem over the
+whole order history. update_sales_rollups() fills them incrementally from
+the SalesWatermark: each run recomputes only the days from the watermark's
+day onwards, so it is idempotent and picks up orders of a partially rolled
+up day. Only orders with a complete payment are counted.
+
+An order whose payment completes after its day was rolled up is only
+counted once that day is recomputed, with update_sales_rollups(since=day)
+(the `update_sales_rollups --since` command).
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from .models import (DailyCollectionSales, DailyCustomerSales, DailyProductSales, Order,
+                     OrderItem, SalesWatermark)
+
+WATERMARK = 'sales'
+
+REVENUE = ExpressionWrapper(
+    F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def get_settle_delay():
+    # Orders placed in the last few seconds may belong to transactions that
+    # have not committed yet, so they are left to the next run
+    return timedelta(seconds=getattr(settings, 'STORE_SALES_ROLLUP_DELAY', 300))
+
+
+def get_watermark():
+    return SalesWatermark.objects \
+        .filter(name=WATERMARK) \
+        .values_list('processed_until', flat=True) \
+        .first()
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def rollup_days(start, stop, until):
+    """
+    Replace the rollups of the days in [start, stop) with aggregates of the
+    completed orders placed in those days before `until`.
+    """
+    end = min(day_start(stop), until)
+    items = OrderItem.objects.filter(
+        order__placed_at__gte=day_start(start),
+        order__placed_at__lt=end,
+        order__payment_status=Order.PAYMENT_STATUS_COMPLETE) \
+        .annotate(day=TruncDate('order__placed_at')) \
+        .order_by()
+    orders = Order.objects.filter(
+        placed_at__gte=day_start(start),
+        placed_at__lt=end,
+        payment_status=Order.PAYMENT_STATUS_COMPLETE) \
+        .annotate(day=TruncDate('placed_at')) \
+        .order_by()
+
+    rows = {
+        DailyProductSales: [
+            DailyProductSales(day=row['day'], product_id=row['product_id'], orders=row['orders'],
+                              quantity=row['sold'], revenue=row['revenue'])
+            for row in items
+            .values('day', 'product_id')
+            .annotate(orders=Count('order_id', distinct=True),
+                      sold=Sum('quantity'), revenue=Sum(REVENUE))
+        ],
+        DailyCollectionSales: [
+            DailyCollectionSales(day=row['day'], collection_id=row['product__collection_id'],
+                                 orders=row['orders'], quantity=row['sold'],
+                                 revenue=row['revenue'])
+            for row in items
+            .values('day', 'product__collection_id')
+            .annotate(orders=Count('order_id', distinct=True),
+                      sold=Sum('quantity'), revenue=Sum(REVENUE))
+        ],
+        DailyCustomerSales: [
+            DailyCustomerSales(day=row['day'], customer_id=row['customer_id'],
+                               orders=row['orders'], revenue=row['revenue'])
+            for row in orders
+            .values('day', 'customer_id')
+            .annotate(orders=Count('id', distinct=True),
+                      revenue=Coalesce(
+                          Sum(F('orderitem__quantity') * F('orderitem__unit_price'),
+                              output_field=REVENUE.output_field),
+                          Decimal(0)))
+        ],
+    }
+    for model, objects in rows.items():
+        model.objects.filter(day__gte=start, day__lt=stop).delete()
+        model.objects.bulk_create(objects, batch_size=1000)
+    return end, {model.__name__: len(objects) for model, objects in rows.items()}
+
+
+def update_sales_rollups(since=None, until=None, batch_days=31, progress=None):
+    """
+    Bring the rollups up to date, `batch_days` days per transaction, and move
+    the watermark along after each batch. Starts at the watermark's day, or
+    at `since` (a date) to rebuild from there, or at the first order when
+    there is neither. `until` defaults to now minus STORE_SALES_ROLLUP_DELAY
+    seconds. `progress(totals)` is called after each batch.
+    """
+    if until is None:
+        until = timezone.now() - get_settle_delay()
+    if since is None:
+        watermark = get_watermark()
+        if watermark is None:
+            watermark = Order.objects \
+                .order_by('placed_at') \
+                .values_list('placed_at', flat=True) \
+                .first()
+        since = timezone.localdate(watermark or until)
+
+    totals = {'since': since.isoformat(), 'until': until.isoformat(), 'batches': 0, 'rows': {}}
+    last_day = timezone.localdate(until)
+    start = since
+    while start <= last_day:
+        stop = start + timedelta(days=batch_days)
+        with transaction.atomic():
+            end, written = rollup_days(start, stop, until)
+            if not SalesWatermark.objects.filter(name=WATERMARK).update(processed_until=end):
+                SalesWatermark.objects.create(name=WATERMARK, processed_until=end)
+        for name, count in written.items():
+            totals['rows'][name] = totals['rows'].get(name, 0) + count
+        totals['batches'] += 1
+        if progress is not None:
+            progress(totals)
+        start = stop
+    return totals
@@ -0,0 +1,116 @@
+import re
+from collections import Counter
+from functools import reduce
+from operator import or_
+from django.conf import settings
+from django.db.models import Case, IntegerField, Max, OuterRef, Q, Subquery, Sum, When
+from django.utils.module_loading import import_string
+from .models import ProductSearchToken
+
+
+TOKEN_PATTERN = re.compile(r'\w+')
+MAX_TOKEN_LENGTH = ProductSearchToken._meta.get_field('token').max_length
+TITLE_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return [token[:MAX_TOKEN_LENGTH] for token in TOKEN_PATTERN.findall(text.lower())]
+
+
+def get_product_tokens(product):
+    weights = Counter()
+    for token in tokenize(product.title):
+        weights[token] += TITLE_WEIGHT
+    for token in tokenize(product.description):
+        weights[token] += DESCRIPTION_WEIGHT
+    return [
+        ProductSearchToken(token=token, product_id=product.id, weight=weight)
+        for token, weight in weights.items()
+    ]
+
+
+def index_products(products):
+    """
+    Replace the postings of the given products with ones built from their
+    current title and description.
+    """
+    products = list(products)
+    ProductSearchToken.objects \
+        .filter(product_id__in=[product.id for product in products]) \
+        .delete()
+    tokens = []
+    for product in products:
+        tokens += get_product_tokens(product)
+    ProductSearchToken.objects.bulk_create(tokens, batch_size=1000)
+
+
+class SearchBackend:
+    def search(self, queryset, terms):
+        raise NotImplementedError
+
+
+class LikeSearchBackend(SearchBackend):
+    """
+    Matches every term against title and description with LIKE '%term%'.
+    Needs no index, but cannot use one either.
+    """
+    fields = ['title', 'description']
+
+    def search(self, queryset, terms):
+        for term in terms:
+            queryset = queryset.filter(reduce(or_, (
+                Q(**{f'{field}__icontains': term}) for field in self.fields
+            )))
+        return queryset
+
+
+class InvertedIndexBackend(SearchBackend):
+    """
+    Looks terms up in the ProductSearchToken posting table. Every term must
+    prefix-match a token of the product, and results are ranked by the sum
+    of the weights of the matched tokens (title tokens count more than
+    description tokens).
+    """
+
+    def search(self, queryset, terms):
+        terms = [token for term in terms for token in tokenize(term)]
+        if not terms:
+            return queryset
+
+        matches = Q()
+        for term in terms:
+            matches |= Q(token__startswith=term)
+        postings = ProductSearchToken.objects.filter(matches).order_by()
+
+        all_terms = {
+            f'term_{index}': Max(Case(
+                When(token__startswith=term, then=1),
+                default=0,
+                output_field=IntegerField()))
+            for index, term in enumerate(terms)
+        }
+        matching_products = postings \
+            .values('product_id') \
+            .annotate(**all_terms) \
+            .filter(**{name: 1 for name in all_terms}) \
+            .values('product_id')
+
+        rank = postings \
+            .filter(product_id=OuterRef('pk')) \
+            .values('product_id') \
+            .annotate(rank=Sum('weight')) \
+            .values('rank')
+
+        return queryset \
+            .filter(pk__in=matching_products) \
+            .annotate(search_rank=Subquery(rank, output_field=IntegerField())) \
+            .order_by('-search_rank', 'id')
+
+
+def get_search_backend():
+    backend = getattr(
+        settings, 'STORE_SEARCH_BACKEND', 'store.search.InvertedIndexBackend')
+    return import_string(backend)()
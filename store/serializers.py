@@ -1,8 +1,20 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, When
+from django.db.models.functions import Now
 from rest_framework import serializers
-from .models import Product, Collection, Review, Cart, CartItem
+from .caching import invalidate
+from .product_ids import product_ids
+from .models import TAX_MULTIPLIER, Product, Collection, Review, Cart, CartItem, Customer, Order, OrderItem, DailyProductSales, DailyCollectionSales, DailyCustomerSales
+from collections import defaultdict
 from decimal import Decimal
 
 
+CENTS = Decimal('0.01')
+# Decimal(1.1) is the binary float's exact value; kept for compatibility
+# with the prices already served, and built once instead of per row
+PRICE_WITH_TAX = Decimal(1.1)
+
+
 class CollectionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Collection
@@ -13,12 +25,30 @@ class CollectionSerializer(serializers.ModelSerializer):
 class ProductSerializer (serializers.ModelSerializer):
   class Meta:
     model = Product
-    fields = ['id', 'title', 'description', 'slug', 'inventory', 'unit_price', 'price_with_tax', 'collection']
+    fields = ['id', 'title', 'description', 'slug', 'inventory', 'unit_price', 'price_with_tax', 'effective_price', 'collection', 'reviews_count', 'last_review_date']
 
   price_with_tax = serializers.SerializerMethodField(method_name='calculate_tax')
+  effective_price = serializers.SerializerMethodField()
 
   def calculate_tax(self, product: Product):
-    return (product.unit_price * Decimal(1.1)).quantize(Decimal('0.01'))
+    return (product.unit_price * PRICE_WITH_TAX).quantize(CENTS)
+
+  def get_effective_price(self, product: Product):
+    # Annotated in the database by ProductQuerySet.with_effective_price
+    if hasattr(product, 'effective_price'):
+      return product.effective_price.quantize(CENTS)
+    discount = max((promotion.discount for promotion in product.promotions.all()), default=0)
+    multiplier = Decimal(1 - discount) * Decimal(TAX_MULTIPLIER)
+    return (product.unit_price * multiplier).quantize(CENTS)
+
+  def to_representation(self, product: Product):
+    data = super().to_representation(product)
+    # Optional expansions, looked up in bulk by ProductViewSet.get_serializer
+    if 'tags' in self.context:
+      data['tags'] = [tag.label for tag in self.context['tags'].get(product.id, [])]
+    if 'likes_count' in self.context:
+      data['likes_count'] = self.context['likes_count'].get(product.id, 0)
+    return data
   
 
 class ReviewSerializer (serializers.ModelSerializer):
@@ -31,6 +61,12 @@ class ReviewSerializer (serializers.ModelSerializer):
       return Review.objects.create(product_id=product_id, **validated_data)
    
 
+class LowStockProductSerializer(serializers.ModelSerializer):
+   class Meta:
+      model = Product
+      fields = ['id', 'title', 'inventory', 'collection']
+
+
 class SimpleProductSerializer (serializers.ModelSerializer):
    class Meta:
       model = Product
@@ -47,13 +83,16 @@ class CartItemSerializer (serializers.ModelSerializer):
    total_price = serializers.SerializerMethodField(method_name='get_total_price', read_only=True)
 
    def get_total_price(self, cart_item: CartItem):
+      # Annotated in the database by CartItemViewSet/CartViewSet querysets
+      if hasattr(cart_item, 'total_price'):
+         return cart_item.total_price
       return cart_item.product.unit_price * cart_item.quantity
 
 class AddCartItemSerializer(serializers.ModelSerializer):
    product_id = serializers.IntegerField()
 
    def validate_product_id(self, value):
-      if not Product.objects.filter(pk=value).exists():
+      if not product_ids.exists(value):
          raise serializers.ValidationError("No product found with the given id")
       else:
          return value
@@ -63,20 +102,88 @@ class AddCartItemSerializer(serializers.ModelSerializer):
       product_id = self.validated_data['product_id']
       quantity = self.validated_data['quantity']
 
-      try:
-        cart_item = CartItem.objects.get(cart_id=cart_id, product_id=product_id)
-        cart_item.quantity += quantity
-        cart_item.save()
-        self.instance = cart_item
-      except CartItem.DoesNotExist:
-        self.instance = CartItem.objects.create(cart_id=cart_id, **self.validated_data)
-      
+      # Increment in the database instead of read-modify-write so concurrent
+      # adds of the same product never lose an update.
+      items = CartItem.objects.filter(cart_id=cart_id, product_id=product_id)
+      if not items.update(quantity=F('quantity') + quantity):
+         try:
+            with transaction.atomic():
+               self.instance = CartItem.objects.create(cart_id=cart_id, **self.validated_data)
+               return self.instance
+         except IntegrityError:
+            # Another request inserted the row between our update and insert,
+            # or the product was deleted since another process cached its id
+            if not items.update(quantity=F('quantity') + quantity):
+               if not Product.objects.filter(pk=product_id).exists():
+                  product_ids.forget(product_id)
+                  raise serializers.ValidationError(
+                     {'product_id': ["No product found with the given id"]})
+               raise
+
+      self.instance = items.get()
       return self.instance
 
    class Meta:
       model = CartItem
       fields = ['id', 'product_id', 'quantity']
 
+class BulkAddCartItemListSerializer(serializers.ListSerializer):
+   def validate(self, attrs):
+      wanted = {item['product_id'] for item in attrs}
+      missing = sorted(wanted - product_ids.filter_existing(wanted))
+      if missing:
+         raise serializers.ValidationError(
+            {'product_id': f'No product found with the given ids: {missing}'})
+      return attrs
+
+   def create(self, validated_data):
+      cart_id = self.context['cart_id']
+      quantities = defaultdict(int)
+      for item in validated_data:
+         quantities[item['product_id']] += item['quantity']
+
+      try:
+         return self.add_items(cart_id, dict(quantities))
+      except IntegrityError:
+         # Another request inserted one of the rows between our select and
+         # insert, or a product was deleted since another process cached its id
+         found = set(Product.objects.filter(pk__in=quantities).order_by().values_list('id', flat=True))
+         missing = sorted(set(quantities) - found)
+         if not missing:
+            # The rows are there now, so this time they are updated
+            return self.add_items(cart_id, dict(quantities))
+         for product_id in missing:
+            product_ids.forget(product_id)
+         raise serializers.ValidationError(
+            {'product_id': f'No product found with the given ids: {missing}'})
+
+   def add_items(self, cart_id, quantities):
+      with transaction.atomic():
+         existing = CartItem.objects \
+            .select_for_update() \
+            .filter(cart_id=cart_id, product_id__in=quantities)
+         to_update = []
+         for cart_item in existing:
+            cart_item.quantity += quantities.pop(cart_item.product_id)
+            to_update.append(cart_item)
+         to_create = [
+            CartItem(cart_id=cart_id, product_id=product_id, quantity=quantity)
+            for product_id, quantity in quantities.items()
+         ]
+         CartItem.objects.bulk_update(to_update, ['quantity'])
+         CartItem.objects.bulk_create(to_create)
+
+      return to_update + to_create
+
+
+class BulkAddCartItemSerializer(serializers.ModelSerializer):
+   product_id = serializers.IntegerField()
+
+   class Meta:
+      model = CartItem
+      fields = ['product_id', 'quantity']
+      list_serializer_class = BulkAddCartItemListSerializer
+
 class UpdateCartItemSerializer(serializers.ModelSerializer):
    class Meta:
       model = CartItem
@@ -92,5 +199,189 @@ class CartSerializer (serializers.ModelSerializer):
    total_price = serializers.SerializerMethodField(method_name='get_total_price')
 
    def get_total_price(self, cart: Cart):
+      # Annotated in the database by CartViewSet.queryset
+      if hasattr(cart, 'total_price'):
+         return cart.total_price
       return sum([item.product.unit_price * item.quantity for item in cart.items.all()])
       
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+   product = SimpleProductSerializer()
+
+   class Meta:
+      model = OrderItem
+      fields = ['id', 'product', 'unit_price', 'quantity']
+
+
+class OrderSerializer(serializers.ModelSerializer):
+   items = OrderItemSerializer(many=True, source='orderitem_set')
+
+   class Meta:
+      model = Order
+      fields = ['id', 'customer', 'placed_at', 'payment_status', 'items']
+
+
+class CreateOrderSerializer(serializers.Serializer):
+   cart_id = serializers.UUIDField()
+
+   def save(self, **kwargs):
+      cart_id = self.validated_data['cart_id']
+
+      with transaction.atomic():
+         # Rolled back with the rest when the checkout fails
+         customer, _ = Customer.objects.get_or_create(user_id=self.context['user_id'])
+         cart_items = list(
+            CartItem.objects
+            .filter(cart_id=cart_id, quantity__gt=0)
+            .select_related('product')
+            .only('product_id', 'quantity', 'product__unit_price'))
+         if not cart_items:
+            raise serializers.ValidationError({'cart_id': 'The cart is empty or does not exist.'})
+
+         # Claiming the cart first makes a concurrent checkout of the same
+         # cart find nothing to delete and roll back.
+         deleted, _ = Cart.objects.filter(pk=cart_id).delete()
+         if not deleted:
+            raise serializers.ValidationError({'cart_id': 'The cart was already checked out.'})
+
+         quantities = {item.product_id: item.quantity for item in cart_items}
+         reserved = reserve_inventory(quantities)
+         if reserved:
+            order = Order.objects.create(customer=customer)
+            OrderItem.objects.bulk_create([
+               OrderItem(
+                  order=order,
+                  product_id=item.product_id,
+                  quantity=item.quantity,
+                  unit_price=item.product.unit_price)
+               for item in cart_items
+            ])
+         else:
+            transaction.set_rollback(True)
+
+      if not reserved:
+         short = sorted(products_short_of(quantities))
+         raise serializers.ValidationError(
+            {'cart_id': f'Not enough inventory for products: {short}'})
+      return order
+
+
+def quantity_for_product(quantities):
+   return Case(
+      *[When(pk=product_id, then=quantity) for product_id, quantity in quantities.items()],
+      output_field=IntegerField())
+
+
+def reserve_inventory(quantities):
+   """
+   Decrement the inventory of every product in one conditional UPDATE.
+   Returns False when any product is short, in which case the caller must
+   roll the transaction back.
+   """
+   needed = quantity_for_product(quantities)
+   updated = Product.objects \
+      .filter(pk__in=quantities, inventory__gte=needed) \
+      .update(inventory=F('inventory') - needed, last_update=Now())
+   # update() bypasses the signals that invalidate cached product responses
+   invalidate('product')
+   return updated == len(quantities)
+
+
+def products_short_of(quantities):
+   return Product.objects \
+      .filter(pk__in=quantities, inventory__lt=quantity_for_product(quantities)) \
+      .values_list('id', flat=True)
+
+
+class ValuesSerializer:
+   """
+   Read-only counterpart of a ModelSerializer that builds the same
+   representation from values() rows, skipping model instances and DRF's
+   per-field machinery. `values` are the columns to select, and
+   to_representation must produce the same keys, in the same order, as the
+   serializer it stands in for.
+   """
+   values = []
+
+   @classmethod
+   def get_queryset(cls, queryset, extra=()):
+      # `extra` columns are selected but not rendered, e.g. the ordering
+      # columns a keyset cursor is built from
+      return queryset.values(*cls.values, *(name for name in extra if name not in cls.values))
+
+   @classmethod
+   def many(cls, rows):
+      to_representation = cls.to_representation
+      return [to_representation(row) for row in rows]
+
+   @staticmethod
+   def to_representation(row):
+      raise NotImplementedError
+
+
+class CollectionValuesSerializer(ValuesSerializer):
+   values = ['id', 'title', 'products_count']
+
+   @staticmethod
+   def to_representation(row):
+      return {'id': row['id'], 'title': row['title'], 'products_count': row['products_count']}
+
+
+class ProductValuesSerializer(ValuesSerializer):
+   # The queryset must be annotated by Product.objects.with_effective_price()
+   values = ['id', 'title', 'description', 'slug', 'inventory', 'unit_price',
+             'effective_price', 'collection_id', 'reviews_count', 'last_review_date']
+
+   @staticmethod
+   def to_representation(row):
+      unit_price = row['unit_price']
+      return {
+         'id': row['id'],
+         'title': row['title'],
+         'description': row['description'],
+         'slug': row['slug'],
+         'inventory': row['inventory'],
+         'unit_price': unit_price,
+         'price_with_tax': (unit_price * PRICE_WITH_TAX).quantize(CENTS),
+         'effective_price': row['effective_price'].quantize(CENTS),
+         'collection': row['collection_id'],
+         'reviews_count': row['reviews_count'],
+         'last_review_date': row['last_review_date'],
+      }
+
+
+class CartItemValuesSerializer(ValuesSerializer):
+   # The queryset must be annotated by views.annotate_cart_items()
+   values = ['id', 'product_id', 'product__title', 'product__unit_price', 'quantity', 'total_price']
+
+   @staticmethod
+   def to_representation(row):
+      return {
+         'id': row['id'],
+         'product': {
+            'id': row['product_id'],
+            'title': row['product__title'],
+            'unit_price': row['product__unit_price'],
+         },
+         'quantity': row['quantity'],
+         'total_price': row['total_price'],
+      }
+
+
+class DailyProductSalesSerializer(serializers.ModelSerializer):
+   class Meta:
+      model = DailyProductSales
+      fields = ['day', 'product', 'orders', 'quantity', 'revenue']
+
+
+class DailyCollectionSalesSerializer(serializers.ModelSerializer):
+   class Meta:
+      model = DailyCollectionSales
+      fields = ['day', 'collection', 'orders', 'quantity', 'revenue']
+
+
+class DailyCustomerSalesSerializer(serializers.ModelSerializer):
+   class Meta:
+      model = DailyCustomerSales
+      fields = ['day', 'customer', 'orders', 'revenue']
@@ -0,0 +1,128 @@
+from django.db import transaction
+from django.db.models.functions import Now
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from .caching import invalidate
+from likes.models import LikedItem
+from tags.models import Tag, TaggedItem
+from .models import Collection, Product, Promotion, Review
+from .product_ids import product_ids
+from .search import index_products
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_products(sender, **kwargs):
+    invalidate('product')
+
+
+@receiver(post_delete, sender=Product)
+def forget_product_id(sender, instance, **kwargs):
+    product_id = instance.pk
+    invalidate('product-ids')
+    transaction.on_commit(lambda: product_ids.forget(product_id))
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_products([instance])
+
+
+@receiver([post_save, post_delete], sender=Collection)
+def invalidate_collections(sender, **kwargs):
+    invalidate('collection')
+
+
+@receiver([post_save, post_delete], sender=Promotion)
+def invalidate_promotions(sender, **kwargs):
+    invalidate('promotion')
+
+
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=TaggedItem)
+def invalidate_tags(sender, **kwargs):
+    invalidate('tag')
+
+
+@receiver([post_save, post_delete], sender=LikedItem)
+def invalidate_likes(sender, **kwargs):
+    invalidate('like')
+
+
+@receiver(m2m_changed, sender=Product.promotions.through)
+def invalidate_product_promotions(sender, **kwargs):
+    invalidate('product')
+
+
+# Promotions change effective_price, so the affected products' last_update
+# (their ETag/Last-Modified validator) has to move with them.
+@receiver(m2m_changed, sender=Product.promotions.through)
+def touch_promoted_products(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        if action == 'pre_clear':
+            touch_products(Product.objects.filter(promotions=instance))
+        elif action in ('post_add', 'post_remove'):
+            touch_products(Product.objects.filter(pk__in=pk_set))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        touch_products(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Promotion)
+@receiver(pre_delete, sender=Promotion)
+def touch_promotion_products(sender, instance, raw=False, **kwargs):
+    if not raw:
+        touch_products(Product.objects.filter(promotions=instance))
+
+
+@receiver(post_init, sender=Product)
+def remember_collection(sender, instance, **kwargs):
+    instance._loaded_collection_id = instance.__dict__.get('collection_id')
+
+
+@receiver(post_save, sender=Product)
+def count_saved_product(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = instance._loaded_collection_id
+    if created:
+        adjust_products_count(instance.collection_id, 1)
+    elif previous is not None and previous != instance.collection_id:
+        adjust_products_count(previous, -1)
+        adjust_products_count(instance.collection_id, 1)
+    instance._loaded_collection_id = instance.collection_id
+
+
+@receiver(post_delete, sender=Product)
+def count_deleted_product(sender, instance, **kwargs):
+    adjust_products_count(instance.collection_id, -1)
+
+
+@receiver(post_save, sender=Review)
+def count_saved_review(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        Product.objects.filter(pk=instance.product_id).add_review(instance.date)
+    else:
+        # An edit moves the review's date (auto_now) to today
+        Product.objects.filter(pk=instance.product_id).update(
+            last_review_date=instance.date, last_update=Now())
+    invalidate('product')
+
+
+@receiver(post_delete, sender=Review)
+def count_deleted_review(sender, instance, origin=None, **kwargs):
+    # Reviews deleted along with their product need no recount
+    if isinstance(origin, Product) or getattr(origin, 'model', None) is Product:
+        return
+    Product.objects.filter(pk=instance.product_id).remove_review()
+    invalidate('product')
+
+
+def adjust_products_count(collection_id, delta):
+    if collection_id is not None:
+        Collection.objects.filter(pk=collection_id).adjust_products_count(delta)
+
+
+def touch_products(queryset):
+    queryset.update(last_update=Now())
@@ -1,3 +1,1182 @@
-from django.test import TestCase
+import json
+import warnings
+from io import StringIO
+from datetime import timedelta
+from decimal import Decimal
+from threading import Barrier, Thread
+from unittest.mock import patch
+from django.db import DatabaseError, connection, router
+from django.contrib.admin.sites import site
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.paginator import UnorderedObjectListWarning
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from .benchmark import ENDPOINTS, run_benchmark, seed_dataset
+from .caching import get_cache, stats as cache_stats
+from .cleanup import purge_abandoned_carts
+from .exports import product_rows
+from .search import InvertedIndexBackend
+from .imports import import_products
+from .reporting import update_sales_rollups
+from core.models import User
+from likes.models import LikedItem
+from tags.models import Tag, TaggedItem
+from .models import (Cart, CartItem, Collection, Customer, DailyCollectionSales, DailyCustomerSales,
+                     DailyProductSales, Order, OrderItem, Product, ProductSearchToken, Promotion,
+                     Review)
+from .paginations import EstimatedCountPaginator, KeysetPagination
+from .product_ids import LRUCache, product_ids
+from .views import CartViewSet, ProductViewSet, annotate_cart_items
+from .serializers import (AddCartItemSerializer, CartItemSerializer, CartSerializer, CollectionSerializer,
+                          CollectionValuesSerializer, ProductSerializer, ProductValuesSerializer)
 
-# Create your tests here.
+
+def add_to_cart(cart_id, product_id, quantity):
+    serializer = AddCartItemSerializer(
+        data={'product_id': product_id, 'quantity': quantity},
+        context={'cart_id': cart_id})
+    serializer.is_valid(raise_exception=True)
+    return serializer.save()
+
+
+class AddCartItemTests(TestCase):
+    def setUp(self):
+        collection = Collection.objects.create(title='Collection')
+        self.product = Product.objects.create(
+            title='Product', slug='product', unit_price=10,
+            inventory=100, collection=collection)
+        self.cart = Cart.objects.create()
+        product_ids.clear()
+
+    def test_adding_a_new_product_creates_an_item(self):
+        item = add_to_cart(self.cart.id, self.product.id, 2)
+
+        self.assertEqual(item.quantity, 2)
+        self.assertEqual(CartItem.objects.count(), 1)
+
+    def test_adding_an_existing_product_increments_quantity(self):
+        add_to_cart(self.cart.id, self.product.id, 2)
+        serializer = AddCartItemSerializer(
+            data={'product_id': self.product.id, 'quantity': 3},
+            context={'cart_id': self.cart.id})
+        serializer.is_valid(raise_exception=True)
+
+        with self.assertNumQueries(2):
+            item = serializer.save()
+
+        self.assertEqual(item.quantity, 5)
+        self.assertEqual(CartItem.objects.count(), 1)
+
+    def test_known_product_ids_are_validated_without_a_query(self):
+        add_to_cart(self.cart.id, self.product.id, 1)
+        serializer = AddCartItemSerializer(
+            data={'product_id': self.product.id, 'quantity': 1},
+            context={'cart_id': self.cart.id})
+
+        with self.assertNumQueries(0):
+            serializer.is_valid(raise_exception=True)
+
+    def test_deleted_product_is_forgotten(self):
+        product_id = self.product.id
+        add_to_cart(self.cart.id, product_id, 1)
+        CartItem.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+
+        serializer = AddCartItemSerializer(
+            data={'product_id': product_id, 'quantity': 1},
+            context={'cart_id': self.cart.id})
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('product_id', serializer.errors)
+
+
+class StaleProductIdTests(TransactionTestCase):
+    # A TransactionTestCase so the foreign key is checked when the write
+    # commits, as in production (SQLite defers it until then)
+
+    def setUp(self):
+        collection = Collection.objects.create(title='Collection')
+        self.product = Product.objects.create(
+            title='Product', slug='product', unit_price=10, inventory=100, collection=collection)
+        deleted = Product.objects.create(
+            title='Deleted', slug='deleted', unit_price=10, inventory=100, collection=collection)
+        self.deleted_id = deleted.id
+        deleted.delete()
+        self.cart = Cart.objects.create()
+        # As if another process had cached the id before the delete
+        product_ids.clear()
+        product_ids.local.add_many([self.deleted_id])
+
+    def test_bulk_add_of_a_deleted_product_is_rejected(self):
+        response = APIClient().post(
+            f'/store/carts/{self.cart.id}/items/bulk/',
+            [{'product_id': self.product.id, 'quantity': 1},
+             {'product_id': self.deleted_id, 'quantity': 1}], format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(self.deleted_id), response.data['product_id'])
+        self.assertNotIn(self.deleted_id, product_ids.local)
+        self.assertEqual(CartItem.objects.count(), 0)
+
+
+class BulkAddCartItemTests(TestCase):
+    def setUp(self):
+        collection = Collection.objects.create(title='Collection')
+        self.products = [
+            Product.objects.create(
+                title=f'Product {i}', slug=f'product-{i}', unit_price=10,
+                inventory=100, collection=collection)
+            for i in range(2)]
+        self.cart = Cart.objects.create()
+        product_ids.clear()
+
+    def bulk_add(self, items, cart_id=None):
+        return APIClient().post(
+            f'/store/carts/{cart_id or self.cart.id}/items/bulk/', items, format='json')
+
+    def quantities(self):
+        return dict(CartItem.objects.filter(cart=self.cart).values_list('product_id', 'quantity'))
+
+    def test_items_are_merged_into_the_cart(self):
+        first, second = self.products
+        add_to_cart(self.cart.id, first.id, 1)
+
+        response = self.bulk_add([
+            {'product_id': first.id, 'quantity': 2},
+            {'product_id': second.id, 'quantity': 1},
+            {'product_id': second.id, 'quantity': 3}])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), {first.id: 3, second.id: 4})
+        self.assertEqual(len(response.data['items']), 2)
+
+    def test_unknown_products_are_rejected(self):
+        response = self.bulk_add([
+            {'product_id': self.products[0].id, 'quantity': 1},
+            {'product_id': 0, 'quantity': 1}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('[0]', str(response.data['product_id']))
+        self.assertEqual(self.quantities(), {})
+
+    def test_unknown_or_malformed_cart_is_not_found(self):
+        items = [{'product_id': self.products[0].id, 'quantity': 1}]
+
+        self.assertEqual(self.bulk_add(items, cart_id='not-a-uuid').status_code, 404)
+        self.assertEqual(
+            self.bulk_add(items, cart_id='00000000-0000-0000-0000-000000000000').status_code, 404)
+
+    def test_row_inserted_concurrently_is_updated(self):
+        product = self.products[0]
+        # Added by another request after our select_for_update found nothing
+        add_to_cart(self.cart.id, product.id, 1)
+        select_for_update = CartItem.objects.select_for_update
+        selects = []
+
+        def racing_select_for_update(*args, **kwargs):
+            selects.append(True)
+            if len(selects) == 1:
+                return CartItem.objects.none()
+            return select_for_update(*args, **kwargs)
+
+        with patch.object(CartItem.objects, 'select_for_update', side_effect=racing_select_for_update):
+            response = self.bulk_add([{'product_id': product.id, 'quantity': 2}])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(selects), 2)
+        self.assertEqual(self.quantities(), {product.id: 3})
+
+
+class ConcurrentAddCartItemTests(TransactionTestCase):
+    threads = 8
+    adds_per_thread = 5
+
+    def setUp(self):
+        # SQLite's test_db_allows_multiple_connections is always False, but
+        # only an in-memory database is really shared by the threads; give
+        # DATABASES['default']['TEST'] a file NAME to run this on SQLite
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('The threads would share one in-memory SQLite connection')
+
+    def test_concurrent_adds_do_not_lose_updates(self):
+        collection = Collection.objects.create(title='Collection')
+        product = Product.objects.create(
+            title='Product', slug='product', unit_price=10,
+            inventory=100, collection=collection)
+        cart = Cart.objects.create()
+        barrier = Barrier(self.threads)
+        errors = []
+
+        def worker():
+            try:
+                barrier.wait()
+                for _ in range(self.adds_per_thread):
+                    add_to_cart(cart.id, product.id, 1)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        workers = [Thread(target=worker) for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        item = CartItem.objects.get(cart=cart, product=product)
+        self.assertEqual(item.quantity, self.threads * self.adds_per_thread)
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        collection = Collection.objects.create(title='Collection')
+        self.chair = Product.objects.create(
+            title='Chair', slug='chair', unit_price=10, inventory=5, collection=collection)
+        self.table = Product.objects.create(
+            title='Table', slug='table', unit_price=50, inventory=1, collection=collection)
+        self.cart = Cart.objects.create()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create(username='buyer', email='buyer@example.com'))
+
+    def checkout(self):
+        return self.client.post('/store/orders/', {'cart_id': str(self.cart.id)}, format='json')
+
+    def test_orders_are_listed_newest_first(self):
+        customer, _ = Customer.objects.get_or_create(user=User.objects.get(username='buyer'))
+        orders = [Order.objects.create(customer=customer) for _ in range(3)]
+        Order.objects.filter(pk=orders[0].pk).update(placed_at=timezone.now() + timedelta(days=1))
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', UnorderedObjectListWarning)
+            response = self.client.get('/store/orders/')
+
+        self.assertEqual([order['id'] for order in response.data['results']],
+                         [orders[0].id, orders[2].id, orders[1].id])
+
+    def test_checkout_creates_order_and_reserves_inventory(self):
+        CartItem.objects.create(cart=self.cart, product=self.chair, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.table, quantity=1)
+
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['items']), 2)
+        self.assertFalse(Cart.objects.filter(pk=self.cart.id).exists())
+        self.chair.refresh_from_db()
+        self.table.refresh_from_db()
+        self.assertEqual((self.chair.inventory, self.table.inventory), (3, 0))
+        self.assertEqual(
+            OrderItem.objects.get(product=self.table).unit_price, self.table.unit_price)
+
+    def test_oversold_checkout_changes_nothing(self):
+        CartItem.objects.create(cart=self.cart, product=self.chair, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.table, quantity=2)
+
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(self.table.id), str(response.data['cart_id']))
+        self.assertTrue(CartItem.objects.filter(cart=self.cart).exists())
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(Customer.objects.filter(user__username='buyer').exists())
+        self.chair.refresh_from_db()
+        self.assertEqual(self.chair.inventory, 5)
+
+
+class EndpointBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dataset = seed_dataset(
+            collections=3, products=60, customers=10, orders=20,
+            carts=5, reviews=100)
+
+    def test_endpoints_stay_within_budget(self):
+        report = run_benchmark(APIClient(), self.dataset, repeat=2)
+
+        self.assertEqual(len(report), len(ENDPOINTS))
+        for row in report:
+            with self.subTest(endpoint=row['name']):
+                self.assertTrue(all(status < 400 for status in row['statuses']), row)
+                self.assertLessEqual(row['queries'], row['query_budget'], row)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        self.collection = Collection.objects.create(title='Collection')
+        self.product = Product.objects.create(
+            title='Chair', slug='chair', unit_price=10, inventory=5, collection=self.collection)
+        self.client = APIClient()
+        get_cache().clear()
+        cache_stats.reset()
+
+    def get(self, url='/store/products/'):
+        return self.client.get(url)['X-Cache']
+
+    def test_second_request_is_a_hit(self):
+        self.assertEqual(self.get(), 'MISS')
+        self.assertEqual(self.get(), 'HIT')
+        self.assertEqual(self.get('/store/products/?ordering=unit_price'), 'MISS')
+
+    def test_writes_bump_the_version(self):
+        writes = [
+            lambda: self.product.save(),
+            lambda: self.collection.save(),
+            lambda: Promotion.objects.create(description='Sale', discount=0.1),
+            lambda: Promotion.objects.get().delete(),
+            lambda: Product.objects.create(
+                title='Lamp', slug='lamp', unit_price=5, inventory=1, collection=self.collection),
+            lambda: Product.objects.get(slug='lamp').delete(),
+        ]
+        for write in writes:
+            self.get()
+            self.assertEqual(self.get(), 'HIT')
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+            self.assertEqual(self.get(), 'MISS')
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_misses_are_not_filled_from_a_lagging_replica(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            lamp = Product.objects.create(
+                title='Lamp', slug='lamp', unit_price=5, inventory=1, collection=self.collection)
+        get_queryset = ProductViewSet.get_queryset
+
+        def lagging_get_queryset(view):
+            queryset = get_queryset(view)
+            if router.db_for_read(Product) == 'replica':
+                # The replica has not seen the new product yet
+                return queryset.exclude(pk=lamp.pk).using('default')
+            return queryset
+
+        with patch.object(ProductViewSet, 'get_queryset', lagging_get_queryset):
+            for cache in ('MISS', 'HIT'):
+                response = self.client.get('/store/products/')
+                self.assertEqual(response['X-Cache'], cache)
+                self.assertIn(lamp.id, [product['id'] for product in response.data['results']])
+
+    def test_clear_inventory_action_invalidates(self):
+        url = f'/store/products/{self.product.id}/'
+        self.get(url)
+        self.client.force_login(User.objects.create(
+            username='admin', email='admin@example.com', is_staff=True, is_superuser=True))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/admin/store/product/', {
+                'action': 'clear_inventory', '_selected_action': [self.product.id]})
+
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['inventory'], 0)
+
+    def test_stats_endpoint(self):
+        self.get()
+        self.get()
+        self.client.force_authenticate(
+            User.objects.create(username='ops', email='ops@example.com', is_staff=True))
+
+        response = self.client.get('/store/cache-stats/')
+
+        self.assertEqual(response.data, {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_stats_endpoint_is_staff_only(self):
+        self.client.force_authenticate(
+            User.objects.create(username='shopper', email='shopper@example.com'))
+
+        self.assertEqual(self.client.get('/store/cache-stats/').status_code, 403)
+
+
+class ProductExpandTests(TestCase):
+    def setUp(self):
+        collection = Collection.objects.create(title='Collection')
+        self.chair, self.lamp = [
+            Product.objects.create(
+                title=title, slug=title.lower(), unit_price=10, inventory=5, collection=collection)
+            for title in ['Chair', 'Lamp']]
+        user = User.objects.create(username='fan', email='fan@example.com')
+        TaggedItem.objects.create(tag=Tag.objects.create(label='wood'), content_object=self.chair)
+        LikedItem.objects.create(user=user, content_object=self.chair)
+        get_cache().clear()
+
+    def get(self, url):
+        response = APIClient().get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_list_expands_tags_and_likes_count(self):
+        data = self.get(f'/store/products/?expand=tags,likes_count&collection_id={self.chair.collection_id}')
+
+        products = {product['id']: product for product in data['results']}
+        self.assertEqual(products[self.chair.id]['tags'], ['wood'])
+        self.assertEqual(products[self.chair.id]['likes_count'], 1)
+        self.assertEqual(products[self.lamp.id]['tags'], [])
+        self.assertEqual(products[self.lamp.id]['likes_count'], 0)
+
+    def test_tag_changes_invalidate_cached_expansions(self):
+        url = f'/store/products/{self.chair.id}/?expand=tags'
+        self.get(url)
+        tag = Tag.objects.get()
+
+        tag.label = 'oak'
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.save()
+        self.assertEqual(self.get(url)['tags'], ['oak'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.delete()
+        self.assertEqual(self.get(url)['tags'], [])
+
+    def test_only_requested_expansions_are_added(self):
+        data = self.get(f'/store/products/{self.chair.id}/?expand=likes_count,unknown')
+
+        self.assertEqual(data['likes_count'], 1)
+        self.assertNotIn('tags', data)
+        self.assertNotIn('tags', self.get(f'/store/products/{self.chair.id}/'))
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.collection = Collection.objects.create(title='Collection')
+        self.product = Product.objects.create(
+            title='Chair', slug='chair', unit_price=10, inventory=5, collection=self.collection)
+        self.client = APIClient()
+        get_cache().clear()
+
+    def test_unchanged_product_is_not_modified(self):
+        url = f'/store/products/{self.product.id}/'
+        etag = self.client.get(url)['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_malformed_pk_is_not_found(self):
+        self.assertEqual(self.client.get('/store/products/abc/').status_code, 404)
+
+    def test_product_change_invalidates_etag(self):
+        url = f'/store/products/{self.product.id}/'
+        etag = self.client.get(url)['ETag']
+        self.product.title = 'Armchair'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_honours_if_modified_since(self):
+        last_modified = self.client.get('/store/products/')['Last-Modified']
+
+        response = self.client.get('/store/products/', HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_etag_depends_on_filters_and_deletions(self):
+        other = Product.objects.create(
+            title='Table', slug='table', unit_price=50, inventory=1, collection=self.collection)
+        etag = self.client.get('/store/products/')['ETag']
+        filtered = self.client.get('/store/products/?unit_price__gt=20')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+
+        response = self.client.get('/store/products/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertNotEqual(filtered, etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_collection_count_change_invalidates_etag(self):
+        url = f'/store/collections/{self.collection.id}/'
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(
+                title='Table', slug='table', unit_price=50, inventory=1, collection=self.collection)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['products_count'], 2)
+
+
+class CollectionCountTests(TestCase):
+    def setUp(self):
+        self.chairs = Collection.objects.create(title='Chairs')
+        self.tables = Collection.objects.create(title='Tables')
+
+    def counts(self):
+        return dict(Collection.objects
+                    .filter(pk__in=[self.chairs.pk, self.tables.pk])
+                    .values_list('title', 'products_count'))
+
+    def test_counts_follow_saves_and_deletes(self):
+        product = Product.objects.create(
+            title='Chair', slug='chair', unit_price=10, inventory=5, collection=self.chairs)
+        product.collection = self.tables
+        product.save()
+        self.assertEqual(self.counts(), {'Chairs': 0, 'Tables': 1})
+
+        product.delete()
+        self.assertEqual(self.counts(), {'Chairs': 0, 'Tables': 0})
+
+    def test_failed_count_update_rolls_back_the_save(self):
+        with patch('store.signals.adjust_products_count', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                Product.objects.create(
+                    title='Chair', slug='chair', unit_price=10, inventory=5, collection=self.chairs)
+
+        self.assertFalse(Product.objects.filter(slug='chair').exists())
+
+
+class EffectivePriceTests(TestCase):
+    def setUp(self):
+        collection = Collection.objects.create(title='Collection')
+        self.sofa = Product.objects.create(
+            title='Sofa', slug='sofa', unit_price=100, inventory=5, collection=collection)
+        self.lamp = Product.objects.create(
+            title='Lamp', slug='lamp', unit_price=80, inventory=5, collection=collection)
+        self.mug = Product.objects.create(
+            title='Mug', slug='mug', unit_price=10, inventory=5, collection=collection)
+        self.sofa.promotions.add(
+            Promotion.objects.create(description='Spring', discount=0.1),
+            Promotion.objects.create(description='Clearance', discount=0.25))
+        self.client = APIClient()
+        get_cache().clear()
+
+    def effective_prices(self, query=''):
+        response = self.client.get(f'/store/products/{query}')
+        return [(row['title'], row['effective_price']) for row in response.data['results']]
+
+    def test_best_promotion_then_tax_is_applied(self):
+        prices = dict(self.effective_prices())
+
+        self.assertEqual(prices, {'Sofa': Decimal('82.50'), 'Lamp': Decimal('88.00'),
+                                  'Mug': Decimal('11.00')})
+
+    def test_list_does_not_query_promotions_per_product(self):
+        with self.assertNumQueries(3):
+            self.client.get('/store/products/')
+
+    def test_filter_and_order_by_effective_price(self):
+        self.assertEqual(
+            self.effective_prices('?ordering=-effective_price&effective_price__gt=50'),
+            [('Lamp', Decimal('88.00')), ('Sofa', Decimal('82.50'))])
+
+    @patch.object(KeysetPagination, 'page_size', 2)
+    def test_cursor_pagination_by_effective_price(self):
+        first = self.client.get('/store/products/?pagination=cursor&ordering=effective_price')
+        second = self.client.get(first.data['next'])
+
+        self.assertEqual([row['title'] for row in first.data['results']], ['Mug', 'Sofa'])
+        self.assertEqual([row['title'] for row in second.data['results']], ['Lamp'])
+
+    def test_promotion_change_invalidates_product_etag(self):
+        url = f'/store/products/{self.lamp.id}/'
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lamp.promotions.add(Promotion.objects.create(description='Flash', discount=0.5))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['effective_price'], Decimal('44.00'))
+
+
+class AsyncCatalogTests(TestCase):
+    def setUp(self):
+        collection = Collection.objects.create(title='Collection')
+        self.products = [
+            Product.objects.create(
+                title=f'Product {index}', slug=f'product-{index}', unit_price=10 + index,
+                inventory=5, collection=collection)
+            for index in range(12)
+        ]
+        self.products[0].promotions.add(Promotion.objects.create(description='Sale', discount=0.5))
+        Review.objects.create(product=self.products[0], name='Ann', description='Good')
+        get_cache().clear()
+
+    async def test_async_views_answer_like_the_drf_views(self):
+        product_id = self.products[0].id
+        paths = [
+            '/store/products/',
+            '/store/products/?page=2&ordering=-effective_price',
+            f'/store/products/?collection_id={self.products[0].collection_id}&unit_price__gt=15',
+            f'/store/products/{product_id}/',
+            f'/store/products/{product_id}/reviews/',
+            '/store/collections/',
+            '/store/products/999999/',
+            '/store/products/?page=9',
+            '/store/products/?search=zzzznotfound',
+            '/store/products/?search=product 1',
+            '/store/products/?search=product&ordering=-unit_price',
+            '/store/products/?pagination=cursor&ordering=-effective_price',
+            '/store/products/?cursor=garbage',
+        ]
+        next_links = []
+        for path in paths:
+            with self.subTest(path=path):
+                expected = await self.assert_same_response(path)
+                if isinstance(expected, dict) and expected.get('next'):
+                    next_links.append(expected['next'].replace('http://testserver', ''))
+        for path in next_links:
+            with self.subTest(path=path):
+                await self.assert_same_response(path)
+
+    async def assert_same_response(self, path):
+        expected = await self.async_client.get(path)
+        response = await self.async_client.get(path.replace('/store/', '/store/async/', 1))
+
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertJSONEqual(
+            response.content.decode().replace('/store/async/', '/store/'),
+            expected.content.decode())
+        return expected.json()
+
+    async def test_expand_is_rejected(self):
+        response = await self.async_client.get('/store/async/products/?expand=tags')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class ValuesSerializerTests(TestCase):
+    def setUp(self):
+        self.collection = Collection.objects.create(title='Collection')
+        for index in range(3):
+            Product.objects.create(
+                title=f'Product {index}', slug=f'product-{index}', unit_price=Decimal('10.15') + index,
+                description=None if index else 'Oak', inventory=5, collection=self.collection)
+        Product.objects.first().promotions.add(
+            Promotion.objects.create(description='Sale', discount=0.15))
+        get_cache().clear()
+
+    def render(self, data):
+        return JSONRenderer().render(data)
+
+    def test_product_rows_render_like_product_serializer(self):
+        queryset = Product.objects.with_effective_price()
+
+        self.assertEqual(
+            self.render(ProductValuesSerializer.many(ProductValuesSerializer.get_queryset(queryset))),
+            self.render(ProductSerializer(queryset, many=True).data))
+
+    def test_cursor_pages_walk_every_ordering_field(self):
+        products = Product.objects.with_effective_price()
+        for field in ProductViewSet.ordering_fields:
+            for ordering in (field, '-' + field):
+                with self.subTest(ordering=ordering):
+                    get_cache().clear()
+                    ids = []
+                    url = f'/store/products/?pagination=cursor&ordering={ordering}'
+                    with patch.object(KeysetPagination, 'page_size', 2):
+                        while url:
+                            response = self.client.get(url)
+                            self.assertEqual(response.status_code, 200)
+                            self.assertNotIn('last_update', response.data['results'][0])
+                            ids += [row['id'] for row in response.data['results']]
+                            url = response.data['next']
+                    tie_breaker = '-id' if ordering.startswith('-') else 'id'
+                    self.assertEqual(
+                        ids, list(products.order_by(ordering, tie_breaker).values_list('id', flat=True)))
+
+    def test_collection_rows_render_like_collection_serializer(self):
+        queryset = Collection.objects.all()
+
+        self.assertEqual(
+            self.render(CollectionValuesSerializer.many(CollectionValuesSerializer.get_queryset(queryset))),
+            self.render(CollectionSerializer(queryset, many=True).data))
+
+    def test_cart_renders_like_cart_serializer(self):
+        filled = Cart.objects.create()
+        for product in Product.objects.all():
+            CartItem.objects.create(cart=filled, product=product, quantity=3)
+        empty = Cart.objects.create()
+
+        for cart in (filled, empty):
+            with self.subTest(cart=cart.id):
+                response = self.client.get(f'/store/carts/{cart.id}/')
+
+                self.assertEqual(
+                    response.content,
+                    self.render(CartSerializer(CartViewSet.queryset.get(pk=cart.id)).data))
+
+    def test_cart_item_rows_render_like_cart_item_serializer(self):
+        cart = Cart.objects.create()
+        for quantity, product in enumerate(Product.objects.all(), start=1):
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        queryset = annotate_cart_items(CartItem.objects.filter(cart=cart)).order_by('id')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/store/carts/{cart.id}/items/')
+
+        self.assertEqual(response.content, self.render(CartItemSerializer(queryset, many=True).data))
+
+    def test_unknown_cart_is_not_found(self):
+        for cart_id in ('not-a-uuid', '6f1d3c1e-0000-4000-8000-000000000000'):
+            with self.subTest(cart_id=cart_id):
+                self.assertEqual(self.client.get(f'/store/carts/{cart_id}/').status_code, 404)
+
+
+class PurgeAbandonedCartsTests(TestCase):
+    def setUp(self):
+        collection = Collection.objects.create(title='Collection')
+        product = Product.objects.create(
+            title='Chair', slug='chair', unit_price=10, inventory=5, collection=collection)
+        self.old = [Cart.objects.create() for _ in range(5)]
+        self.recent = Cart.objects.create()
+        Cart.objects.filter(pk__in=[cart.id for cart in self.old]) \
+            .update(created_at=timezone.now() - timedelta(days=40))
+        for cart in self.old + [self.recent]:
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+
+    def test_old_carts_and_their_items_are_deleted_in_batches(self):
+        batches = []
+
+        totals = purge_abandoned_carts(days=30, batch_size=2, progress=lambda t: batches.append(dict(t)))
+
+        self.assertEqual((totals['carts'], totals['items'], totals['batches']), (5, 5, 3))
+        self.assertEqual([batch['carts'] for batch in batches], [2, 4, 5])
+        self.assertEqual(list(Cart.objects.values_list('id', flat=True)), [self.recent.id])
+        self.assertEqual(CartItem.objects.count(), 1)
+
+    def test_dry_run_deletes_nothing(self):
+        totals = purge_abandoned_carts(days=30, batch_size=2, dry_run=True)
+
+        self.assertEqual((totals['carts'], totals['items'], totals['batches']), (5, 5, 3))
+        self.assertEqual(Cart.objects.count(), 6)
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.customers = []
+        for index in range(3):
+            user = User.objects.create(username=f'user{index}', email=f'user{index}@example.com')
+            self.customers.append(Customer.objects.create(user=user, phone='000'))
+        for _ in range(2):
+            Order.objects.create(customer=self.customers[0])
+
+    def test_count_is_capped_past_the_exact_limit(self):
+        with patch.object(EstimatedCountPaginator, 'exact_count_limit', 2):
+            paginator = EstimatedCountPaginator(Customer.objects.order_by('pk'), 1)
+            self.assertEqual(paginator.count, 3)
+            paginator = EstimatedCountPaginator(
+                Customer.objects.filter(phone='000').order_by('pk'), 1)
+            self.assertEqual(paginator.count, 3)
+        paginator = EstimatedCountPaginator(Customer.objects.order_by('pk'), 1)
+        self.assertEqual(paginator.count, 3)
+
+    def test_customer_orders_count(self):
+        admin = site._registry[Customer]
+        queryset = admin.get_queryset(RequestFactory().get('/admin/store/customer/'))
+
+        counts = {customer.pk: customer.orders_count for customer in queryset}
+
+        self.assertEqual(counts, {self.customers[0].pk: 2, self.customers[1].pk: 0,
+                                  self.customers[2].pk: 0})
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        collection = Collection.objects.create(title='Collection')
+        self.chair = Product.objects.create(
+            title='Chair', slug='chair', unit_price=10, inventory=5, collection=collection)
+        self.table = Product.objects.create(
+            title='Table', slug='table', unit_price=50, inventory=5, collection=collection)
+        user = User.objects.create(username='buyer', email='buyer@example.com', is_staff=True)
+        self.customer = Customer.objects.create(user=user, phone='000')
+        self.today = timezone.localdate()
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def order(self, days_ago, status=Order.PAYMENT_STATUS_COMPLETE, items=()):
+        order = Order.objects.create(customer=self.customer, payment_status=status)
+        Order.objects.filter(pk=order.pk).update(
+            placed_at=timezone.now() - timedelta(days=days_ago))
+        for product, quantity in items:
+            OrderItem.objects.create(
+                order=order, product=product, quantity=quantity, unit_price=product.unit_price)
+        return order
+
+    def test_rollups_count_completed_orders_incrementally(self):
+        self.order(3, items=[(self.chair, 2), (self.table, 1)])
+        self.order(3, items=[(self.chair, 1)])
+        self.order(3, status=Order.PAYMENT_STATUS_PENDING, items=[(self.chair, 5)])
+        update_sales_rollups(until=timezone.now())
+
+        self.order(0, items=[(self.table, 2)])
+        with self.assertNumQueries(13):
+            update_sales_rollups(until=timezone.now())
+
+        chair = DailyProductSales.objects.get(product=self.chair)
+        self.assertEqual((chair.day, chair.orders, chair.quantity, chair.revenue),
+                         (self.today - timedelta(days=3), 2, 3, Decimal(30)))
+        self.assertEqual(
+            list(DailyCollectionSales.objects.order_by('day').values_list('orders', 'revenue')),
+            [(2, Decimal(80)), (1, Decimal(100))])
+        self.assertEqual(
+            list(DailyCustomerSales.objects.order_by('day').values_list('orders', 'revenue')),
+            [(2, Decimal(80)), (1, Decimal(100))])
+
+    def test_rebuild_since_a_day_is_idempotent(self):
+        self.order(1, items=[(self.chair, 1)])
+        until = timezone.now()
+        update_sales_rollups(until=until)
+        update_sales_rollups(since=self.today - timedelta(days=5), until=until, batch_days=2)
+
+        self.assertEqual(DailyProductSales.objects.get().quantity, 1)
+
+    def test_report_endpoints(self):
+        self.order(2, items=[(self.chair, 1)])
+        self.order(1, items=[(self.chair, 2), (self.table, 1)])
+        update_sales_rollups(until=timezone.now())
+
+        response = self.client.get(
+            '/store/reports/product-sales/', {'product_id': self.chair.id})
+        self.assertEqual([row['quantity'] for row in response.data['results']], [2, 1])
+
+        response = self.client.get(
+            '/store/reports/product-sales/totals/',
+            {'since': (self.today - timedelta(days=1)).isoformat()})
+        self.assertEqual(
+            [(row['product_id'], row['quantity']) for row in response.data['results']],
+            [(self.table.id, 1), (self.chair.id, 2)])
+
+        self.client.force_authenticate(
+            User.objects.create(username='shopper', email='shopper@example.com'))
+        self.assertEqual(self.client.get('/store/reports/customer-sales/').status_code, 403)
+
+
+class ReviewSummaryTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        collection = Collection.objects.create(title='Collection')
+        self.product = Product.objects.create(
+            title='Chair', slug='chair', unit_price=10, inventory=5, collection=collection)
+        self.client = APIClient()
+        self.url = f'/store/products/{self.product.id}/reviews/'
+
+    def summary(self):
+        data = self.client.get(f'/store/products/{self.product.id}/').data
+        return data['reviews_count'], data['last_review_date']
+
+    def test_summary_follows_reviews(self):
+        self.assertEqual(self.summary(), (0, None))
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.client.post(self.url, {'name': 'a', 'description': 'good'}).data
+            self.client.post(self.url, {'name': 'b', 'description': 'fine'})
+        self.assertEqual(self.summary(), (2, timezone.localdate().isoformat()))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"{self.url}{first['id']}/")
+        self.assertEqual(self.summary(), (1, timezone.localdate().isoformat()))
+
+        Product.objects.update(reviews_count=0, last_review_date=None)
+        Product.objects.refresh_review_summary()
+        get_cache().clear()
+        self.assertEqual(self.summary(), (1, timezone.localdate().isoformat()))
+
+    def test_reviews_are_paginated_newest_first(self):
+        today = timezone.localdate()
+        Review.objects.bulk_create([
+            Review(product=self.product, name=str(index), description='ok') for index in range(15)
+        ])
+        for index, review in enumerate(Review.objects.order_by('id')):
+            Review.objects.filter(pk=review.pk).update(date=today - timedelta(days=index % 3))
+        expected = list(Review.objects.order_by('-date', '-id').values_list('id', flat=True))
+
+        first = self.client.get(self.url).data
+        second = self.client.get(first['next']).data
+
+        self.assertEqual([review['id'] for review in first['results'] + second['results']], expected)
+        self.assertIsNone(second['next'])
+
+    def test_deleting_the_product_skips_the_recount(self):
+        Review.objects.bulk_create([
+            Review(product=self.product, name=str(index), description='ok') for index in range(5)
+        ])
+        with CaptureQueriesContext(connection) as captured:
+            self.product.delete()
+        self.assertFalse(any('UPDATE "store_product"' in query['sql'] for query in captured))
+
+
+class ProductIdCacheTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        product_ids.clear()
+        product_ids.reset_stats()
+        collection = Collection.objects.create(title='Collection')
+        self.products = [
+            Product.objects.create(
+                title=f'Product {index}', slug=f'product-{index}', unit_price=10,
+                inventory=5, collection=collection)
+            for index in range(3)
+        ]
+
+    def test_unknown_ids_are_looked_up_in_one_query(self):
+        ids = [product.id for product in self.products]
+        with self.assertNumQueries(1):
+            self.assertEqual(product_ids.filter_existing(ids + [999999]), set(ids))
+        with self.assertNumQueries(1):
+            # Ids that do not exist are never cached
+            self.assertEqual(product_ids.filter_existing(ids + [999999]), set(ids))
+
+        product_ids.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(product_ids.filter_existing(ids), set(ids))
+
+        self.assertEqual(product_ids.stats(), {
+            'local': {'hits': 3, 'misses': 8, 'hit_rate': 3 / 11},
+            'shared': {'hits': 3, 'misses': 5, 'hit_rate': 3 / 8},
+        })
+
+    def test_lru_evicts_and_expires(self):
+        now = [0.0]
+        cache = LRUCache(maxsize=2, ttl=10, clock=lambda: now[0])
+        cache.add_many([1, 2])
+        self.assertIn(1, cache)
+        cache.add_many([3])
+
+        self.assertEqual((1 in cache, 2 in cache, 3 in cache), (True, False, True))
+        now[0] = 10
+        self.assertNotIn(1, cache)
+        self.assertEqual(len(cache), 1)
+
+
+class LowStockTests(TestCase):
+    def setUp(self):
+        collection = Collection.objects.create(title='Collection')
+        self.products = [
+            Product.objects.create(
+                title=f'Product {index}', slug=f'product-{index}', unit_price=10,
+                inventory=inventory, collection=collection)
+            for index, inventory in enumerate([12, 3, 0, 9, 3, 40])
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create(username='ops', email='ops@example.com', is_staff=True))
+
+    def test_low_stock_is_listed_lowest_first(self):
+        with patch.object(KeysetPagination, 'page_size', 2):
+            first = self.client.get('/store/inventory/low-stock/').data
+            second = self.client.get(first['next']).data
+
+        self.assertEqual(
+            [(row['id'], row['inventory']) for row in first['results'] + second['results']],
+            [(self.products[2].id, 0), (self.products[1].id, 3), (self.products[4].id, 3),
+             (self.products[3].id, 9)])
+
+    def test_threshold_can_be_configured(self):
+        with self.settings(STORE_LOW_STOCK_THRESHOLD=4):
+            response = self.client.get('/store/inventory/low-stock/')
+        self.assertEqual(len(response.data['results']), 3)
+
+        response = self.client.get('/store/inventory/low-stock/', {'threshold': 20})
+        self.assertEqual(len(response.data['results']), 5)
+        response = self.client.get('/store/inventory/low-stock/', {'threshold': 'many'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_update_in_batches(self):
+        queryset = Product.objects.filter(inventory__gt=0)
+
+        with self.assertNumQueries(3 * 4):
+            updated = queryset.update_in_batches(batch_size=2, inventory=0)
+
+        self.assertEqual(updated, 5)
+        self.assertEqual(set(Product.objects.values_list('inventory', flat=True)), {0})
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.chairs = Collection.objects.create(title='Chairs')
+        self.tables = Collection.objects.create(title='Tables')
+        self.products = [
+            Product.objects.create(
+                title=f'Product {index}', slug=f'product-{index}', unit_price=price,
+                inventory=5, collection=self.chairs if index % 2 else self.tables)
+            for index, price in enumerate([10, 20, 20, 30, 20])
+        ]
+        self.promotion = Promotion.objects.create(description='Sale', discount=0.5)
+        self.products[1].promotions.add(self.promotion)
+
+    def export(self, **params):
+        response = self.client.get('/store/products/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        lines = self.export().splitlines()
+
+        self.assertEqual(lines[0].split(','), [
+            'id', 'title', 'slug', 'description', 'unit_price', 'effective_price', 'inventory',
+            'last_update', 'collection_id', 'collection_title', 'promotions'])
+        self.assertEqual(len(lines), 6)
+        row = lines[2].split(',')
+        self.assertEqual(row[:3], [str(self.products[1].id), 'Product 1', 'product-1'])
+        self.assertEqual((row[5], row[9], row[10]), ('11.00', 'Chairs', str(self.promotion.id)))
+
+    def test_ndjson_is_filtered_and_ordered(self):
+        rows = [json.loads(line) for line in self.export(
+            output='ndjson', collection_id=self.chairs.id, ordering='-unit_price').splitlines()]
+
+        self.assertEqual([row['id'] for row in rows], [self.products[3].id, self.products[1].id])
+        self.assertEqual(rows[1]['promotions'], [self.promotion.id])
+
+    def test_unknown_output_is_rejected(self):
+        response = self.client.get('/store/products/export/', {'output': 'xml'})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_rows_are_read_in_keyset_pages(self):
+        queryset = Product.objects.with_effective_price().order_by('-unit_price')
+
+        # A page of products and its promotions per 2 products
+        with self.assertNumQueries(6):
+            ids = [row['id'] for row in product_rows(queryset, chunk_size=2)]
+
+        self.assertEqual(ids, list(queryset.order_by('-unit_price', '-id').values_list('id', flat=True)))
+
+
+class ImportProductsTests(TestCase):
+    header = 'title,slug,description,unit_price,inventory,collection_id'
+
+    def setUp(self):
+        self.chairs = Collection.objects.create(title='Chairs')
+        self.tables = Collection.objects.create(title='Tables')
+        self.existing = Product.objects.create(
+            title='Old chair', slug='chair', unit_price=10, inventory=5, collection=self.chairs)
+
+    def run_import(self, *rows, **kwargs):
+        lines = [self.header + '\n'] + [row + '\n' for row in rows]
+        with self.captureOnCommitCallbacks(execute=True):
+            return import_products(lines, **kwargs).as_dict()
+
+    def test_creates_and_updates_by_slug(self):
+        report = self.run_import(
+            f'Oak chair,chair,Sturdy,12.50,7,{self.tables.id}',
+            f'Oak table,table,,99,3,{self.tables.id}')
+
+        self.assertEqual((report['read'], report['created'], report['updated'], report['failed']),
+                         (2, 1, 1, 0))
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.title, self.existing.unit_price, self.existing.collection_id),
+                         ('Oak chair', Decimal('12.50'), self.tables.id))
+        self.assertIsNone(Product.objects.get(slug='table').description)
+
+    def test_invalid_rows_are_reported_with_line_numbers(self):
+        report = self.run_import(
+            f'Lamp,lamp,,abc,3,{self.chairs.id}',
+            f',rug,,5,3,{self.chairs.id}',
+            f'Desk,desk,,5,3,{self.chairs.id}',
+            'Vase,vase,,5,3,999999')
+
+        self.assertEqual((report['created'], report['failed']), (1, 3))
+        self.assertEqual([(error['line'], list(error['errors'])) for error in report['errors']], [
+            (2, ['unit_price']), (3, ['title']), (5, ['collection_id'])])
+        self.assertEqual(list(Product.objects.order_by('slug').values_list('slug', flat=True)),
+                         ['chair', 'desk'])
+
+    def test_non_integral_numbers_are_rejected(self):
+        report = self.run_import(
+            f'Lamp,lamp,,5,3.7,{self.chairs.id}',
+            f'Rug,rug,,5,3,{self.chairs.id}.5')
+        lines = [
+            json.dumps({'title': 'Desk', 'slug': 'desk', 'unit_price': 5, 'inventory': 3.7,
+                        'collection_id': self.chairs.id}) + '\n',
+            json.dumps({'title': 'Vase', 'slug': 'vase', 'unit_price': 5, 'inventory': 3,
+                        'collection_id': self.chairs.id + 0.5}) + '\n',
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            ndjson_report = import_products(lines, 'ndjson').as_dict()
+
+        for report in (report, ndjson_report):
+            self.assertEqual(report['failed'], 2)
+            self.assertEqual([list(error['errors']) for error in report['errors']],
+                             [['inventory'], ['collection_id']])
+        self.assertFalse(Product.objects.exclude(slug='chair').exists())
+
+    def test_upload_that_is_not_utf8_is_rejected(self):
+        client = APIClient()
+        client.force_authenticate(
+            User.objects.create(username='ops', email='ops@example.com', is_staff=True))
+        content = f'{self.header}\nCaf\xe9 chair,cafe,,5,3,{self.chairs.id}\n'.encode('latin-1')
+
+        response = client.post('/store/products/import/', {
+            'file': SimpleUploadedFile('products.csv', content)}, format='multipart')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('utf-8', response.data['file'])
+
+    def test_later_duplicate_slug_in_a_chunk_wins(self):
+        report = self.run_import(
+            f'First,lamp,,5,1,{self.chairs.id}',
+            f'Second,lamp,,6,2,{self.chairs.id}')
+
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(Product.objects.get(slug='lamp').title, 'Second')
+
+    def test_search_index_and_counts_are_maintained(self):
+        self.run_import(
+            f'Oak chair,chair,,12,7,{self.tables.id}',
+            f'Linen lamp,lamp,,5,1,{self.chairs.id}',
+            chunk_size=1)
+
+        self.assertEqual(
+            dict(Collection.objects
+                 .filter(pk__in=[self.chairs.id, self.tables.id])
+                 .values_list('title', 'products_count')),
+            {'Chairs': 1, 'Tables': 1})
+        tokens = set(ProductSearchToken.objects
+                     .filter(product=self.existing)
+                     .values_list('token', flat=True))
+        self.assertEqual(tokens, {'oak', 'chair'})
+        self.assertTrue(ProductSearchToken.objects.filter(token='linen').exists())
+
+
+class InvertedIndexSearchTests(TestCase):
+    def setUp(self):
+        collection = Collection.objects.create(title='Collection')
+
+        def create(title, description=''):
+            return Product.objects.create(
+                title=title, slug=title.lower().replace(' ', '-'), description=description,
+                unit_price=10, inventory=5, collection=collection)
+
+        self.oak_chair = create('Oak chair', 'A chair')
+        self.oak_lamp = create('Oak lamp')
+        self.steel_table = create('Steel table', 'Goes with an oak chair')
+
+    def search(self, *terms):
+        results = InvertedIndexBackend().search(Product.objects.all(), terms)
+        return [product.id for product in results]
+
+    def tokens(self, product):
+        return set(ProductSearchToken.objects.filter(product=product).values_list('token', flat=True))
+
+    def test_index_follows_saves_and_deletes(self):
+        self.oak_lamp.title = 'Linen lamp'
+        self.oak_lamp.save()
+        self.assertEqual(self.tokens(self.oak_lamp), {'linen', 'lamp'})
+
+        self.oak_lamp.delete()
+        self.assertFalse(ProductSearchToken.objects.filter(token='linen').exists())
+
+    def test_terms_prefix_match_and_must_all_match(self):
+        self.assertEqual(set(self.search('oa')), {self.oak_chair.id, self.oak_lamp.id, self.steel_table.id})
+        self.assertEqual(self.search('oak', 'lam'), [self.oak_lamp.id])
+        self.assertEqual(self.search('oak', 'sofa'), [])
+
+    def test_title_matches_rank_first(self):
+        # Title tokens weigh 3, description tokens 1
+        self.assertEqual(self.search('chair'), [self.oak_chair.id, self.steel_table.id])
+
+    def test_rebuild_search_index(self):
+        ProductSearchToken.objects.all().delete()
+
+        call_command('rebuild_search_index', batch_size=2, stdout=StringIO())
+
+        self.assertEqual(self.tokens(self.steel_table), {'steel', 'table', 'goes', 'with', 'an', 'oak', 'chair'})
+        self.assertEqual(set(self.search('oak')), {self.oak_chair.id, self.oak_lamp.id, self.steel_table.id})
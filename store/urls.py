@@ -1,10 +1,17 @@
-from .views import ProductViewSet, CollectionViewSet, ReviewViewSet, CartViewSet, CartItemViewSet
+from django.urls import path
+from .views import ProductViewSet, CollectionViewSet, ReviewViewSet, CartViewSet, CartItemViewSet, OrderViewSet, ProductSalesViewSet, CollectionSalesViewSet, CustomerSalesViewSet, LowStockViewSet, response_cache_stats, product_id_cache_stats
 from rest_framework_nested import routers
+from . import async_views
 
 router = routers.DefaultRouter()
 router.register('products', ProductViewSet, basename='products')
 router.register('collections', CollectionViewSet)
 router.register('carts', CartViewSet)
+router.register('orders', OrderViewSet, basename='orders')
+router.register('inventory/low-stock', LowStockViewSet, basename='low-stock')
+router.register('reports/product-sales', ProductSalesViewSet, basename='product-sales')
+router.register('reports/collection-sales', CollectionSalesViewSet, basename='collection-sales')
+router.register('reports/customer-sales', CustomerSalesViewSet, basename='customer-sales')
 
 product_router = routers.NestedDefaultRouter(router, 'products', lookup='product')
 product_router.register('reviews', ReviewViewSet, basename='product-reviews')
@@ -13,4 +20,12 @@ cart_router = routers.NestedDefaultRouter(router, 'carts', lookup='cart')
 cart_router.register('items', CartItemViewSet, basename='cart-items')
 
 
-urlpatterns = router.urls + product_router.urls + cart_router.urls
+urlpatterns = [
+    path('cache-stats/', response_cache_stats, name='cache-stats'),
+    path('cache-stats/product-ids/', product_id_cache_stats, name='product-id-cache-stats'),
+    path('async/products/', async_views.product_list, name='async-products-list'),
+    path('async/products/<int:pk>/', async_views.product_detail, name='async-products-detail'),
+    path('async/products/<int:product_pk>/reviews/', async_views.review_list,
+         name='async-product-reviews-list'),
+    path('async/collections/', async_views.collection_list, name='async-collections-list'),
+] + router.urls + product_router.urls + cart_router.urls
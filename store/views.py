@@ -1,28 +1,159 @@
-from django.db.models import Count
+import csv
+from io import TextIOWrapper
+from django.db import router
+from django.db.models import DecimalField, ExpressionWrapper, F, Prefetch, Sum, Value
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import status
+from rest_framework import serializers, status
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin, DestroyModelMixin
-from rest_framework.filters import SearchFilter, OrderingFilter
-from .models import Product, Collection, OrderItem, Review, Cart, CartItem
-from .serializers import ProductSerializer, CollectionSerializer, ReviewSerializer, CartSerializer, CartItemSerializer, AddCartItemSerializer, UpdateCartItemSerializer
-from .filters import ProductFilter
-from .paginations import DefaultPagination
+from rest_framework.mixins import CreateModelMixin, ListModelMixin, RetrieveModelMixin, DestroyModelMixin
+from rest_framework.filters import OrderingFilter
+from rest_framework.generics import get_object_or_404
+from core.routers import ReplicaReadMixin
+from likes.models import LikedItem
+from tags.models import TaggedItem
+from .models import Product, Collection, Order, OrderItem, Review, Cart, CartItem, DailyProductSales, DailyCollectionSales, DailyCustomerSales
+from .serializers import ProductSerializer, CollectionSerializer, ReviewSerializer, CartSerializer, CartItemSerializer, AddCartItemSerializer, BulkAddCartItemSerializer, UpdateCartItemSerializer, CreateOrderSerializer, OrderSerializer, CollectionValuesSerializer, ProductValuesSerializer, CartItemValuesSerializer, DailyProductSalesSerializer, DailyCollectionSalesSerializer, DailyCustomerSalesSerializer, LowStockProductSerializer
+from .caching import CachedResponseMixin, ConditionalGetMixin, stats as cache_stats
+from .exports import CONTENT_TYPES, export_lines
+from .imports import import_products
+from .filters import ProductFilter, ProductSearchFilter, DailyProductSalesFilter, DailyCollectionSalesFilter, DailyCustomerSalesFilter
+from .paginations import DefaultPagination, KeysetPagination
+from .product_ids import product_ids
 
 
-class ProductViewSet(ModelViewSet):
-   queryset = Product.objects.all()
+class ValuesListMixin:
+    """
+    Serves list with `values_serializer_class` (see serializers.ValuesSerializer)
+    from values() rows, unless get_values_serializer_class() returns None.
+    Filtering and pagination work as usual.
+    """
+    values_serializer_class = None
+
+    def get_values_serializer_class(self):
+        return self.values_serializer_class
+
+    def list(self, request, *args, **kwargs):
+        values_serializer_class = self.get_values_serializer_class()
+        if values_serializer_class is None:
+            return super().list(request, *args, **kwargs)
+
+        # The ordering columns (and id) too, which KeysetPagination reads
+        # its cursor from
+        extra = dict.fromkeys([*(getattr(self, 'ordering_fields', None) or []), 'id'])
+        queryset = values_serializer_class.get_queryset(
+            self.filter_queryset(self.get_queryset()), extra)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(values_serializer_class.many(page))
+        return Response(values_serializer_class.many(queryset))
+
+
+class ProductViewSet(ReplicaReadMixin, ConditionalGetMixin, CachedResponseMixin, ValuesListMixin, ModelViewSet):
+   replica_actions = ['list', 'retrieve', 'export']
+   cache_models = ['product', 'collection', 'promotion']
+   queryset = Product.objects.with_effective_price()
    serializer_class = ProductSerializer
-   filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+   values_serializer_class = ProductValuesSerializer
+   filter_backends = [DjangoFilterBackend, ProductSearchFilter, OrderingFilter]
    filterset_class = ProductFilter
    search_fields = ['title', 'description']
-   ordering_fields = ['unit_price', 'last_update']
+   ordering_fields = ['unit_price', 'effective_price', 'last_update']
    pagination_class = DefaultPagination
 
+   @property
+   def paginator(self):
+      # ?pagination=cursor (or following a cursor link) switches to keyset
+      # pagination, which avoids OFFSET scans and the COUNT(*) on deep pages.
+      if not hasattr(self, '_paginator'):
+         params = self.request.query_params
+         if params.get('pagination') == 'cursor' or KeysetPagination.cursor_query_param in params:
+            self._paginator = KeysetPagination()
+         else:
+            self._paginator = self.pagination_class()
+      return self._paginator
+
    def get_serializer_context(self):
       return {'request': self.request}
+
+   def get_expansions(self):
+      # ?expand=tags,likes_count
+      expand = self.request.query_params.get('expand', '')
+      return {name for name in expand.split(',') if name in ('tags', 'likes_count')}
+
+   def uses_conditional_get(self):
+      # Tags and likes do not touch Product.last_update
+      return not self.get_expansions()
+
+   def get_values_serializer_class(self):
+      # Expansions are added by ProductSerializer
+      if self.get_expansions():
+         return None
+      return self.values_serializer_class
+
+   def get_cache_models(self):
+      expansions = self.get_expansions()
+      models = list(self.cache_models)
+      if 'tags' in expansions:
+         models.append('tag')
+      if 'likes_count' in expansions:
+         models.append('like')
+      return models
+
+   def get_serializer(self, instance=None, *args, **kwargs):
+      expansions = self.get_expansions()
+      if instance is not None and expansions:
+         products = instance if kwargs.get('many') else [instance]
+         product_ids = [product.id for product in products]
+         context = self.get_serializer_context()
+         if 'tags' in expansions:
+            context['tags'] = TaggedItem.objects.get_tags_for_many(Product, product_ids)
+         if 'likes_count' in expansions:
+            context['likes_count'] = LikedItem.objects.get_like_counts_for_many(Product, product_ids)
+         kwargs['context'] = context
+      return super().get_serializer(instance, *args, **kwargs)
    
+   @action(detail=False)
+   def export(self, request):
+      # ?output=csv (default) or ?output=ndjson; filters, search and
+      # ordering work as on the list endpoint
+      output = request.query_params.get('output', 'csv')
+      if output not in CONTENT_TYPES:
+         return Response({'output': f'Must be one of {sorted(CONTENT_TYPES)}.'},
+                         status=status.HTTP_400_BAD_REQUEST)
+      # The stream is consumed after the view returns, outside the request's
+      # routing state, so bind the queryset to its database now
+      queryset = self.filter_queryset(self.get_queryset()).using(router.db_for_read(Product))
+      if not queryset.query.order_by:
+         queryset = queryset.order_by('id')
+      response = StreamingHttpResponse(
+         export_lines(queryset, output), content_type=CONTENT_TYPES[output])
+      response['Content-Disposition'] = f'attachment; filename="products.{output}"'
+      return response
+
+   @action(detail=False, methods=['post'], url_path='import',
+           permission_classes=[IsAdminUser], parser_classes=[MultiPartParser])
+   def import_file(self, request):
+      # multipart upload in field `file`; .ndjson/.jsonl files are read as
+      # NDJSON, anything else as CSV
+      upload = request.FILES.get('file')
+      if upload is None:
+         return Response({'file': 'No file was submitted.'}, status=status.HTTP_400_BAD_REQUEST)
+      input_format = 'ndjson' if upload.name.endswith(('.ndjson', '.jsonl')) else 'csv'
+      lines = TextIOWrapper(upload.file, encoding='utf-8', newline='')
+      try:
+         report = import_products(lines, input_format)
+      except (UnicodeDecodeError, csv.Error) as error:
+         # Chunks before the one that failed to parse stay imported
+         return Response({'file': f'Could not parse the file: {error}'},
+                         status=status.HTTP_400_BAD_REQUEST)
+      return Response(report.as_dict())
+
    def destroy(self, request, *args, **kwargs):  
        if OrderItem.objects.filter(product_id=kwargs['pk']).count() > 0:
           return Response({'Product cannot be deleted because it is associated with one or more order item'},status=status.HTTP_405_METHOD_NOT_ALLOWED)
@@ -30,9 +161,11 @@ class ProductViewSet(ModelViewSet):
        return super().destroy(request, *args, **kwargs)
    
 
-class CollectionViewSet(ModelViewSet):
-    queryset = Collection.objects.annotate(products_count=Count('product'))
+class CollectionViewSet(ReplicaReadMixin, ConditionalGetMixin, CachedResponseMixin, ValuesListMixin, ModelViewSet):
+    cache_models = ['collection', 'product']
+    queryset = Collection.objects.all()
     serializer_class = CollectionSerializer
+    values_serializer_class = CollectionValuesSerializer
 
     def destroy(self, request, *args, **kwargs):
         if Product.objects.filter(collection=kwargs['pk']).count() > 0:
@@ -41,8 +174,13 @@ class CollectionViewSet(ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 
-class ReviewViewSet(ModelViewSet):
+class ReviewViewSet(ReplicaReadMixin, ModelViewSet):
     serializer_class = ReviewSerializer
+    # Newest first, seeking on (date, id) through the (product, date) index;
+    # the total is Product.reviews_count
+    pagination_class = KeysetPagination
+    ordering = ['-date']
+    ordering_fields = ['date']
 
     def get_queryset(self):
         return Review.objects.filter(product_id=self.kwargs['product_pk'])
@@ -51,18 +189,36 @@ class ReviewViewSet(ModelViewSet):
         return {'product_id': self.kwargs['product_pk']}
     
 
+PRICE_TOTAL_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+
+def annotate_cart_items(queryset):
+    return queryset \
+        .select_related('product') \
+        .only('id', 'cart_id', 'quantity', 'product__id', 'product__title', 'product__unit_price') \
+        .annotate(total_price=ExpressionWrapper(
+            F('quantity') * F('product__unit_price'), output_field=PRICE_TOTAL_FIELD))
+
+
 class CartViewSet(CreateModelMixin, 
                   RetrieveModelMixin, 
                   DestroyModelMixin, 
                   GenericViewSet):
-    queryset = Cart.objects.prefetch_related('items__product').all()
+    queryset = Cart.objects \
+        .prefetch_related(Prefetch('items', queryset=annotate_cart_items(CartItem.objects.all()))) \
+        .annotate(total_price=Coalesce(
+            Sum(F('items__quantity') * F('items__product__unit_price'), output_field=PRICE_TOTAL_FIELD),
+            Value(0), output_field=PRICE_TOTAL_FIELD))
     serializer_class = CartSerializer
 
-class CartItemViewSet(ModelViewSet):
+class CartItemViewSet(ValuesListMixin, ModelViewSet):
     http_method_names = ['get', 'post', 'patch', 'delete']
+    values_serializer_class = CartItemValuesSerializer
 
     def get_serializer_class(self):
-        if self.request.method == 'POST':
+        if self.action == 'bulk':
+            return BulkAddCartItemSerializer
+        elif self.request.method == 'POST':
             return AddCartItemSerializer
         elif self.request.method == 'PATCH':
             return UpdateCartItemSerializer
@@ -72,7 +228,138 @@ class CartItemViewSet(ModelViewSet):
         return {'cart_id': self.kwargs['cart_pk']}
 
     def get_queryset(self):
-        return CartItem.objects.filter(cart_id = self.kwargs['cart_pk']).select_related('product')
-    
-        
+        return annotate_cart_items(CartItem.objects.filter(cart_id = self.kwargs['cart_pk']))
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request, cart_pk=None):
+        get_object_or_404(Cart, pk=cart_pk)
+        serializer = self.get_serializer(data=request.data, many=True, allow_empty=False)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        cart = CartViewSet.queryset.get(pk=cart_pk)
+        return Response(CartSerializer(cart).data)
+
+
+class OrderViewSet(CreateModelMixin,
+                   ListModelMixin,
+                   RetrieveModelMixin,
+                   GenericViewSet):
+    permission_classes = [IsAuthenticated]
+    pagination_class = DefaultPagination
+
+    def get_queryset(self):
+        items = OrderItem.objects \
+            .select_related('product') \
+            .only('id', 'order_id', 'quantity', 'unit_price',
+                  'product__id', 'product__title', 'product__unit_price')
+        queryset = Order.objects \
+            .prefetch_related(Prefetch('orderitem_set', queryset=items)) \
+            .order_by('-placed_at', '-id')
+        if self.request.user.is_staff:
+            return queryset
+        return queryset.filter(customer__user_id=self.request.user.id)
+
+    def get_serializer_class(self):
+        if self.request.method == 'POST':
+            return CreateOrderSerializer
+        return OrderSerializer
+
+    def get_serializer_context(self):
+        return {'user_id': self.request.user.id}
+
+    def create(self, request, *args, **kwargs):
+        serializer = CreateOrderSerializer(
+            data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        order = serializer.save()
+        order = self.get_queryset().get(pk=order.pk)
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+
+
+class LowStockViewSet(ListModelMixin, GenericViewSet):
+    """
+    Products with less inventory than ?threshold= (STORE_LOW_STOCK_THRESHOLD
+    by default), lowest first. Pages seek on (inventory, id), which the
+    Product index on those columns serves directly.
+    """
+    permission_classes = [IsAdminUser]
+    serializer_class = LowStockProductSerializer
+    pagination_class = KeysetPagination
+    ordering = ['inventory']
+    ordering_fields = ['inventory']
+
+    def get_threshold(self):
+        threshold = self.request.query_params.get('threshold')
+        if threshold is None:
+            return None
+        try:
+            return int(threshold)
+        except ValueError:
+            raise serializers.ValidationError({'threshold': 'Must be an integer.'})
+
+    def get_queryset(self):
+        return Product.objects \
+            .low_stock(self.get_threshold()) \
+            .only('id', 'title', 'inventory', 'collection_id')
+
+
+class SalesReportViewSet(ReplicaReadMixin, ListModelMixin, GenericViewSet):
+    """
+    Read-only views over the daily sales rollups (see store.reporting), which
+    are only as fresh as the last update_sales_rollups run. list returns the
+    daily rows, totals sums them per `group_field` over the filtered days.
+    Both take ?since= and ?until= dates.
+    """
+    permission_classes = [IsAdminUser]
+    pagination_class = DefaultPagination
+    filter_backends = [DjangoFilterBackend]
+    replica_actions = ['list', 'totals']
+    group_field = None
+    sum_fields = ['orders', 'revenue']
+
+    def get_queryset(self):
+        return self.queryset.order_by('-day', self.group_field)
+
+    @action(detail=False)
+    def totals(self, request):
+        queryset = self.filter_queryset(self.get_queryset()) \
+            .values(self.group_field) \
+            .annotate(**{field: Sum(field) for field in self.sum_fields}) \
+            .order_by('-revenue', self.group_field)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(page)
+
+
+class ProductSalesViewSet(SalesReportViewSet):
+    queryset = DailyProductSales.objects.all()
+    serializer_class = DailyProductSalesSerializer
+    filterset_class = DailyProductSalesFilter
+    group_field = 'product_id'
+    sum_fields = ['orders', 'quantity', 'revenue']
+
+
+class CollectionSalesViewSet(SalesReportViewSet):
+    queryset = DailyCollectionSales.objects.all()
+    serializer_class = DailyCollectionSalesSerializer
+    filterset_class = DailyCollectionSalesFilter
+    group_field = 'collection_id'
+    sum_fields = ['orders', 'quantity', 'revenue']
+
+
+class CustomerSalesViewSet(SalesReportViewSet):
+    queryset = DailyCustomerSales.objects.all()
+    serializer_class = DailyCustomerSalesSerializer
+    filterset_class = DailyCustomerSalesFilter
+    group_field = 'customer_id'
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def response_cache_stats(request):
+    return Response(cache_stats.as_dict())
+
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def product_id_cache_stats(request):
+    return Response(product_ids.stats())
@@ -49,6 +49,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'core.middleware.PerformanceMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -98,6 +100,66 @@ DATABASES = {
     }
 }
 
+# Aliases in DATABASES that replicate 'default'. Read-only API actions
+# (core.routers.ReplicaReadMixin) are spread over them round robin; give
+# each one 'TEST': {'MIRROR': 'default'} so tests run against one database.
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Seconds a client stays on the primary after a request that wrote
+REPLICA_PIN_SECONDS = 5
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Seconds a cached product/collection response is kept (see store.caching)
+STORE_CACHE_TIMEOUT = 300
+
+# Fraction of requests timed by core.middleware.PerformanceMiddleware and
+# seconds between the summary lines it logs (0 disables logging)
+METRICS_SAMPLE_RATE = 1.0
+METRICS_LOG_INTERVAL = 60
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core.metrics': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
+
+# Products with less inventory than this are "Low" in the admin and listed
+# by /store/inventory/low-stock/
+STORE_LOW_STOCK_THRESHOLD = 10
+
+# In-process cache of existing product ids used to validate cart items
+# (see store.product_ids): how many ids it holds and for how many seconds
+STORE_PRODUCT_ID_CACHE_SIZE = 10000
+STORE_PRODUCT_ID_CACHE_TTL = 30
+
+# Backend answering ?search= on /store/products/ (see store.search)
+STORE_SEARCH_BACKEND = 'store.search.InvertedIndexBackend'
+
+# Carts older than this many days are removed by
+# ./manage.py purge_abandoned_carts (see store.cleanup)
+STORE_ABANDONED_CART_DAYS = 30
+
+# ./manage.py update_sales_rollups leaves orders placed in the last this
+# many seconds to its next run (see store.reporting)
+STORE_SALES_ROLLUP_DELAY = 300
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -0,0 +1,68 @@
+"""
+Production profile, configured from the environment:
+
+    DJANGO_SETTINGS_MODULE=storefront.settings_production
+
+DJANGO_SECRET_KEY and DJANGO_ALLOWED_HOSTS are required. The database
+comes from DB_NAME, DB_HOST, DB_PORT, DB_USER and DB_PASSWORD, with read
+replicas (see core.routers) from the comma-separated DB_REPLICA_HOSTS.
+
+DB_CONN_MAX_AGE keeps connections open across requests for that many
+seconds (0 closes them after every request, as the development settings
+do). Keep it below MySQL's wait_timeout. DB_CONN_HEALTH_CHECKS pings a
+reused connection before its first query in a request, so a connection
+the server dropped is replaced instead of failing the request. Measure
+a deployment with ./manage.py benchmark_connections.
+"""
+import os
+from .settings import *
+
+
+def env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_list(name):
+    return [item.strip() for item in os.environ.get(name, '').split(',') if item.strip()]
+
+
+DEBUG = env_bool('DJANGO_DEBUG', False)
+
+SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+
+ALLOWED_HOSTS = env_list('DJANGO_ALLOWED_HOSTS')
+
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if middleware != 'debug_toolbar.middleware.DebugToolbarMiddleware'
+]
+
+database = {
+    'ENGINE': 'django.db.backends.mysql',
+    'NAME': os.environ.get('DB_NAME', 'storefront2'),
+    'PORT': os.environ.get('DB_PORT', ''),
+    'USER': os.environ.get('DB_USER', 'root'),
+    'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+    'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+    'CONN_HEALTH_CHECKS': env_bool('DB_CONN_HEALTH_CHECKS', True),
+}
+
+DATABASES = {
+    'default': {
+        **database,
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+    },
+}
+for index, host in enumerate(env_list('DB_REPLICA_HOSTS'), start=1):
+    DATABASES[f'replica_{index}'] = {
+        **database,
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', 0.1))
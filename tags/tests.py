@@ -1,3 +1,31 @@
 from django.test import TestCase
+from store.models import Collection, Product
+from .models import Tag, TaggedItem
 
-# Create your tests here.
+
+class TaggedItemManagerTests(TestCase):
+    def setUp(self):
+        collection = Collection.objects.create(title='Collection')
+        self.chair, self.lamp, self.table = [
+            Product.objects.create(
+                title=title, slug=title.lower(), unit_price=10, inventory=5, collection=collection)
+            for title in ['Chair', 'Lamp', 'Table']]
+        self.wood = Tag.objects.create(label='wood')
+        self.sale = Tag.objects.create(label='sale')
+        for product, tag in [(self.chair, self.wood), (self.chair, self.sale), (self.table, self.wood)]:
+            TaggedItem.objects.create(tag=tag, content_object=product)
+
+    def test_get_tags_for_many(self):
+        with self.assertNumQueries(1):
+            tags = TaggedItem.objects.get_tags_for_many(Product, [self.chair.id, self.lamp.id])
+
+        self.assertEqual(set(tags), {self.chair.id, self.lamp.id})
+        self.assertEqual({tag.label for tag in tags[self.chair.id]}, {'wood', 'sale'})
+        self.assertEqual(tags[self.lamp.id], [])
+
+    def test_tags_of_other_models_are_ignored(self):
+        TaggedItem.objects.create(tag=self.sale, content_object=self.chair.collection)
+
+        tags = TaggedItem.objects.get_tags_for_many(Product, [self.chair.collection.id])
+
+        self.assertEqual(tags, {self.chair.collection.id: []})